@@ -0,0 +1,336 @@
+from . import compilation_cache
+from . import metrics
+from . import mmseqs2
+from . import predict
+
+import argparse
+import numpy as np
+import os
+import queue
+import re
+import threading
+import time
+
+from absl import logging
+from typing import List, NoReturn, Optional, Tuple
+
+
+def read_fasta(filename: str) -> List[Tuple[str, str]]:
+
+    r"""Reads a multi-record FASTA file
+
+    Parameters
+    ----------
+    filename : Name of FASTA file
+
+    Returns
+    ----------
+    List of (name, sequence) tuples, with names reduced to the first word
+    (repeated names are suffixed _2, _3, ... so outputs do not collide)
+
+    """
+
+    records, seen = [], {}
+    for line in open(filename, "r"):
+        line = line.strip()
+        if line.startswith(">"):
+            name = re.sub(r"\W+", "_", line[1:].split()[0]) if len(line) > 1 else ""
+            name = unique = name or f"target{ len(records) }"
+            while unique in seen:
+                seen[name] += 1
+                unique = f"{ name }_{ seen[name] }"
+            if unique != name:
+                logging.warning(f"Duplicate FASTA name { name }; using { unique }")
+            seen[unique] = 1
+            records.append([unique, ""])
+        elif len(line) > 0 and len(records) > 0:
+            records[-1][1] += line
+
+    return [tuple(r) for r in records]
+
+
+def fetch_alignments(
+    records: List[Tuple[str, str]],
+    jobs: queue.Queue,
+    templates: List[str] = [],
+) -> NoReturn:
+
+    r"""Producer: fetches alignments and templates for every target
+    Each result is put on the queue, followed by None once all are done
+
+    Parameters
+    ----------
+    records : List of (name, sequence) tuples
+    jobs : Bounded queue shared with the prediction consumer
+    templates : PDB IDs to use as templates
+
+    Returns
+    ----------
+    None
+
+    """
+
+    for name, seq in records:
+        try:
+            runner = mmseqs2.MMSeqs2Runner(name, seq)
+            a3m_lines, template_path = runner.run_job(templates=templates)
+            jobs.put((name, runner.seq, a3m_lines, template_path, None))
+
+        except Exception as e:
+            logging.error(f"Could not fetch alignment for { name }: { e }")
+            jobs.put((name, seq, None, None, e))
+
+    jobs.put(None)
+
+
+def predict_target(
+    name: str,
+    seq: str,
+    a3m_lines: str,
+    template_path: str,
+    outdir: str,
+    args: argparse.Namespace,
+    ledger: metrics.MetricsLedger = None,
+) -> List[dict]:
+
+    r"""Consumer: runs every model for one target
+
+    Parameters
+    ----------
+    name : Target name
+    seq : Sequence
+    a3m_lines : String of entire alignment
+    template_path : Where to locate templates (empty if none)
+    outdir : Directory for this target's models
+    args : Parsed command-line arguments
+    ledger : Metrics ledger to append to (optional)
+
+    Returns
+    ----------
+    One summary row per model, including failed ones
+
+    """
+
+    rows = []
+    for i in range(args.n_models):
+
+        outname = os.path.join(outdir, f"{ name }_{ i }.pdb")
+        random_seed = args.seed + i if args.seed >= 0 else -1
+
+        # Cycle through the models (only 1 and 2 accept templates)
+        model_id = i % 2 + 1 if template_path else i % 5 + 1
+
+        kwargs = dict(
+            model_id=model_id,
+            model_params=model_id,
+            random_seed=random_seed,
+            max_msa_clusters=args.max_msa_clusters,
+            max_extra_msa=args.max_extra_msa,
+            max_recycles=args.max_recycles,
+            n_struct_module_repeats=args.n_struct_module_repeats,
+            ledger=ledger,
+            cache_features=not args.no_feature_cache,
+            bfactor=args.bfactor,
+            regions=dict(args.region),
+        )
+
+        start = time.time()
+        try:
+            if template_path:
+                result = predict.predict_structure_from_templates(
+                    seq, outname, a3m_lines, template_path, **kwargs
+                )
+            else:
+                result = predict.predict_structure_no_templates(
+                    seq, outname, a3m_lines, **kwargs
+                )
+
+        except Exception as e:
+            # Keep going: earlier and later models are still reported
+            logging.error(f"Prediction failed for { outname }: { e }")
+            rows.append(
+                {
+                    "target": name,
+                    "model": outname,
+                    "model_id": model_id,
+                    "seconds": time.time() - start,
+                    "status": f"error: { e }",
+                }
+            )
+            continue
+
+        rows.append(
+            {
+                "target": name,
+                "model": outname,
+                "model_id": model_id,
+                "plddt": float(np.mean(result["plddt"])),
+                "ptm": float(result["ptm"]) if "ptm" in result else np.nan,
+                "seconds": time.time() - start,
+                "status": "ok",
+            }
+        )
+
+    return rows
+
+
+def parse_region(text: str) -> Tuple[str, Tuple[int, int]]:
+
+    r"""Parses a region given as name:first-last, e.g. tm1:10-35
+
+    Parameters
+    ----------
+    text : Region name and 1-based, inclusive residue range
+
+    Returns
+    ----------
+    Tuple with [0] name and [1] (first, last)
+
+    """
+
+    match = re.fullmatch(r"(\w+):(\d+)-(\d+)", text.strip())
+    if match is None:
+        raise argparse.ArgumentTypeError(
+            f"Expected name:first-last (e.g. tm1:10-35), got { text }"
+        )
+
+    name, first, last = match.groups()
+    return name, (int(first), int(last))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+
+    r"""Parses command-line arguments
+
+    Parameters
+    ----------
+    argv : Arguments (default=sys.argv)
+
+    Returns
+    ----------
+    Parsed arguments
+
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Predict structures for every target in a FASTA file"
+    )
+    parser.add_argument("fasta", help="Multi-record FASTA file")
+    parser.add_argument("--outdir", default="predictions")
+    parser.add_argument("--n_models", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=-1)
+    parser.add_argument("--max_msa_clusters", type=int, default=-1)
+    parser.add_argument("--max_extra_msa", type=int, default=-1)
+    parser.add_argument("--max_recycles", type=int, default=3)
+    parser.add_argument("--n_struct_module_repeats", type=int, default=8)
+    parser.add_argument(
+        "--templates", default="", help="Comma-separated PDB IDs, e.g. 6LB8_A"
+    )
+    parser.add_argument(
+        "--compilation_cache",
+        default="",
+        help="Directory for compiled models, reused across runs",
+    )
+    parser.add_argument(
+        "--ledger",
+        default="",
+        help="Directory of the per-model metrics ledger to append to",
+    )
+    parser.add_argument(
+        "--no_feature_cache",
+        action="store_true",
+        help="Process features with runner.process_features, as in earlier "
+        "releases, so that seeded runs sample the same MSA clusters",
+    )
+    parser.add_argument(
+        "--bfactor",
+        action="store_true",
+        help="Write B factors converted from pLDDT instead of raw pLDDT",
+    )
+    parser.add_argument(
+        "--region",
+        type=parse_region,
+        action="append",
+        default=[],
+        help="Residue range for a per-region pLDDT ledger column, given as "
+        "name:first-last (repeatable)",
+    )
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=2,
+        help="Alignments fetched ahead of the prediction stage",
+    )
+
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> NoReturn:
+
+    r"""Runs the batch pipeline
+    Alignments are fetched in a background thread while predictions run,
+    so neither the network nor the accelerator waits on the other
+
+    Parameters
+    ----------
+    argv : Arguments (default=sys.argv)
+
+    Returns
+    ----------
+    None
+
+    """
+
+    args = parse_args(argv)
+    records = read_fasta(args.fasta)
+    templates = [t for t in args.templates.split(",") if t]
+
+    if args.compilation_cache:
+        compilation_cache.enable(args.compilation_cache)
+
+    if not os.path.isdir(args.outdir):
+        os.makedirs(args.outdir)
+
+    ledger = metrics.MetricsLedger(args.ledger) if args.ledger else None
+
+    jobs = queue.Queue(maxsize=max(1, args.queue_size))
+    producer = threading.Thread(
+        target=fetch_alignments, args=(records, jobs, templates), daemon=True
+    )
+    producer.start()
+
+    summary = os.path.join(args.outdir, "summary.tsv")
+    columns = ("target", "model", "model_id", "plddt", "ptm", "seconds", "status")
+
+    with open(summary, "w") as outfile:
+        outfile.write("\t".join(columns) + "\n")
+
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+
+            name, seq, a3m_lines, template_path, error = job
+            logging.info(f"Predicting { name } ({ len(seq) } residues)")
+
+            if error is None:
+                outdir = os.path.join(args.outdir, name)
+                if not os.path.isdir(outdir):
+                    os.makedirs(outdir)
+                rows = predict_target(
+                    name, seq, a3m_lines, template_path, outdir, args, ledger
+                )
+            else:
+                rows = [{"target": name, "status": f"error: { error }"}]
+
+            for row in rows:
+                outfile.write(
+                    "\t".join(str(row.get(c, "")) for c in columns) + "\n"
+                )
+            outfile.flush()
+
+    producer.join()
+
+
+if __name__ == "__main__":
+    main()
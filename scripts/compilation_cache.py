@@ -0,0 +1,163 @@
+import os
+
+import jax
+
+from absl import logging
+from typing import Dict, Mapping, NoReturn, Optional
+
+# Events JAX records while compiling (see jax.monitoring)
+_HIT_EVENT = "/jax/compilation_cache/cache_hits"
+_MISS_EVENT = "/jax/compilation_cache/cache_misses"
+_COMPILE_EVENT = "/jax/core/compile/backend_compile_duration"
+
+_cache_dir = ""
+_listening = None
+_stats = {"hits": 0, "misses": 0, "compile_secs": 0.0}
+
+
+def enable(cache_dir: str) -> NoReturn:
+
+    r"""Turns on JAX's persistent compilation cache
+    Compiled AlphaFold graphs are written to cache_dir and reused by any
+    later process with the same model config and input shapes
+
+    Parameters
+    ----------
+    cache_dir : Directory to store compiled executables
+
+    Returns
+    ----------
+    None
+
+    """
+
+    global _cache_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    try:
+        jax.config.update("jax_compilation_cache_dir", cache_dir)
+    except AttributeError:
+        # Older JAX releases
+        from jax.experimental.compilation_cache import compilation_cache
+
+        compilation_cache.initialize_cache(cache_dir)
+
+    # Cache every executable, however quick it was to compile
+    for option in (
+        "jax_persistent_cache_min_compile_time_secs",
+        "jax_persistent_cache_min_entry_size_bytes",
+    ):
+        try:
+            jax.config.update(option, 0)
+        except AttributeError:
+            logging.warning(
+                f"This JAX release has no { option } option; "
+                "quickly compiled graphs may not be cached"
+            )
+
+    _cache_dir = cache_dir
+    _listen()
+    logging.info(f"Persistent compilation cache: { cache_dir }")
+
+
+def is_enabled() -> bool:
+
+    r"""Whether enable has been called in this process"""
+
+    return bool(_cache_dir)
+
+
+def _on_event(event: str, **kwargs) -> NoReturn:
+    if event == _HIT_EVENT:
+        _stats["hits"] += 1
+    elif event == _MISS_EVENT:
+        _stats["misses"] += 1
+
+
+def _on_duration(event: str, duration_secs: float, **kwargs) -> NoReturn:
+    if event == _COMPILE_EVENT:
+        _stats["compile_secs"] += duration_secs
+
+
+def _listen() -> bool:
+
+    r"""Subscribes to JAX's compilation events (once per process)
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    ----------
+    False if this JAX release does not report them
+
+    """
+
+    global _listening
+
+    if _listening is None:
+        try:
+            from jax import monitoring
+
+            monitoring.register_event_listener(_on_event)
+            monitoring.register_event_duration_secs_listener(_on_duration)
+            _listening = True
+        except (ImportError, AttributeError):
+            logging.warning("This JAX release does not report compilation events")
+            _listening = False
+
+    return _listening
+
+
+def stats() -> Dict[str, Optional[float]]:
+
+    r"""Compilation events seen by this process so far
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    ----------
+    Dictionary with persistent cache "hits" and "misses" and seconds spent
+    in backend compilation ("compile_secs"); values are None if JAX does
+    not report these events
+
+    """
+
+    if not _listen():
+        return {k: None for k in _stats}
+
+    return dict(_stats)
+
+
+def since(before: Mapping[str, Optional[float]]) -> Dict[str, Optional[float]]:
+
+    r"""Compilation events since an earlier call to stats, e.g. one prediction
+    Hits and misses are JAX's own persistent cache lookups, so a graph that
+    was never written to the cache (or a cache JAX ignores, such as on
+    older releases off TPU) does not count as a hit
+
+    Parameters
+    ----------
+    before : Output of stats
+
+    Returns
+    ----------
+    Dictionary with the same keys as stats
+
+    """
+
+    after = stats()
+    if after["hits"] is None:
+        return after
+
+    delta = {k: after[k] - before[k] for k in after}
+    if delta["hits"] or delta["misses"] or delta["compile_secs"]:
+        logging.info(
+            f"Compilation: { delta['hits'] } cache hits, { delta['misses'] } "
+            f"misses, { round(delta['compile_secs'], 1) } s compiling"
+        )
+
+    return delta
@@ -0,0 +1,274 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import socket
+import time
+
+from absl import logging
+from typing import NoReturn
+
+
+class SearchCoordinator:
+
+    r"""Coordinates MMseqs2 server queries between processes
+
+    Processes sharing a root directory (e.g. on a shared filesystem)
+    submit at most one ticket per sequence: the first caller claims the
+    sequence, and later callers wait for its published result. All
+    requests to the server also draw from one rate-limit budget
+
+    Private variables
+    ----------
+    self.root: Shared directory
+    self.max_requests: Requests allowed per interval, across processes
+    self.interval: Length of the rate-limit window (seconds)
+    self.stale_after: Age after which an unfinished claim is abandoned
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_requests: int = 10,
+        interval: float = 60.0,
+        stale_after: float = 3600.0,
+    ):
+
+        r"""Initialize coordinator
+
+        Parameters
+        ----------
+        root : Shared directory
+        max_requests : Requests allowed per interval, across processes
+        interval : Length of the rate-limit window (seconds)
+        stale_after : Age after which an unfinished claim is abandoned
+
+        """
+
+        self.root = root
+        self.max_requests = max_requests
+        self.interval = interval
+        self.stale_after = stale_after
+
+        os.makedirs(os.path.join(root, "claims"), exist_ok=True)
+        os.makedirs(os.path.join(root, "results"), exist_ok=True)
+
+    def key(self, seq: str, mode: str = "env") -> str:
+
+        r"""Identifies a query by its sequence and search mode
+
+        Parameters
+        ----------
+        seq : Amino acid sequence
+        mode : Search mode submitted to the server
+
+        Returns
+        ----------
+        Hex digest
+
+        """
+
+        return hashlib.sha1(f"{ mode }:{ seq }".encode()).hexdigest()
+
+    def throttle(self) -> NoReturn:
+
+        r"""Blocks until the shared request budget allows one more request
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        None
+
+        """
+
+        path = os.path.join(self.root, "ratelimit.json")
+
+        while True:
+            with open(path, "a+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                try:
+                    stamps = json.loads(f.read() or "[]")
+                except ValueError:
+                    stamps = []
+
+                now = time.time()
+                stamps = [t for t in stamps if now - t < self.interval]
+
+                if len(stamps) < self.max_requests:
+                    stamps.append(now)
+                    wait = 0.0
+                else:
+                    wait = min(stamps) + self.interval - now
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(stamps))
+
+            if wait <= 0:
+                return
+
+            logging.debug(f"Rate limit reached, waiting { round(wait, 1) } s")
+            time.sleep(wait)
+
+    def _claim_path(self, key: str) -> str:
+        return os.path.join(self.root, "claims", key)
+
+    def result(self, key: str) -> str:
+
+        r"""Finds a published result
+
+        Parameters
+        ----------
+        key : Query identifier
+
+        Returns
+        ----------
+        Path to shared archive (empty if not yet available)
+
+        """
+
+        path = os.path.join(self.root, "results", f"{ key }.tar.gz")
+        return path if os.path.isfile(path) else ""
+
+    def _is_stale(self, path: str) -> bool:
+
+        r"""Checks whether a claim was abandoned by its owner
+
+        Parameters
+        ----------
+        path : Claim file
+
+        Returns
+        ----------
+        True if the owner process is gone or the claim is too old
+
+        """
+
+        try:
+            with open(path, "r") as f:
+                owner = json.load(f)
+            age = time.time() - os.path.getmtime(path)
+        except (OSError, ValueError):
+            return False
+
+        if age > self.stale_after:
+            return True
+
+        if owner.get("host") == socket.gethostname():
+            try:
+                os.kill(owner["pid"], 0)
+            except ProcessLookupError:
+                return True
+            except PermissionError:
+                pass
+
+        return False
+
+    def claim(self, key: str) -> bool:
+
+        r"""Attempts to become the process that submits this query
+
+        Parameters
+        ----------
+        key : Query identifier
+
+        Returns
+        ----------
+        True if this process now owns the query
+
+        """
+
+        path = self._claim_path(key)
+
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                # Check and remove under throttle's lock, so two processes
+                # cannot both take over (and one delete the other's claim)
+                with open(os.path.join(self.root, "ratelimit.json"), "a") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    stale = self._is_stale(path)
+                    if stale:
+                        logging.warning(f"Removing stale MMseqs2 claim { key }")
+                        self.release(key)
+                if not stale:
+                    return False
+                continue
+
+            with os.fdopen(fd, "w") as f:
+                json.dump({"host": socket.gethostname(), "pid": os.getpid()}, f)
+            return True
+
+        return False
+
+    def release(self, key: str) -> NoReturn:
+
+        r"""Gives up ownership of a query
+
+        Parameters
+        ----------
+        key : Query identifier
+
+        Returns
+        ----------
+        None
+
+        """
+
+        try:
+            os.remove(self._claim_path(key))
+        except FileNotFoundError:
+            pass
+
+    def publish(self, key: str, tar_path: str) -> NoReturn:
+
+        r"""Shares a downloaded archive and releases the claim
+
+        Parameters
+        ----------
+        key : Query identifier
+        tar_path : Downloaded archive
+
+        Returns
+        ----------
+        None
+
+        """
+
+        dest = os.path.join(self.root, "results", f"{ key }.tar.gz")
+        tmp = f"{ dest }.{ os.getpid() }.tmp"
+        shutil.copyfile(tar_path, tmp)
+        os.replace(tmp, dest)
+        self.release(key)
+
+    def wait(self, key: str, poll: float = 5.0) -> str:
+
+        r"""Waits for another process to publish a result
+
+        Parameters
+        ----------
+        key : Query identifier
+        poll : Seconds between checks
+
+        Returns
+        ----------
+        Path to shared archive (empty if the owner gave up)
+
+        """
+
+        while True:
+            result = self.result(key)
+            if result:
+                return result
+
+            path = self._claim_path(key)
+            if not os.path.isfile(path) or self._is_stale(path):
+                return ""
+
+            time.sleep(poll)
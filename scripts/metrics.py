@@ -0,0 +1,317 @@
+import fcntl
+import json
+import numpy as np
+import os
+
+from typing import Any, Callable, Dict, List, Mapping, NoReturn, Optional
+
+# Value written when a row lacks a column
+_MISSING = {"f8": np.nan, "i8": -1, "str": ""}
+
+
+def _infer_dtype(value: Any) -> str:
+
+    r"""Picks a column type for a new value
+
+    Parameters
+    ----------
+    value : Value to store in the column
+
+    Returns
+    ----------
+    "i8" for integers and booleans, "f8" for other numbers, else "str"
+
+    """
+
+    if isinstance(value, (bool, int, np.integer, np.bool_)):
+        return "i8"
+    if isinstance(value, (float, np.floating)):
+        return "f8"
+    return "str"
+
+
+class MetricsLedger:
+
+    r"""Append-only, columnar table of per-model metrics
+
+    Each column is its own file in the ledger directory: numeric columns
+    are raw little-endian arrays and string columns are newline-separated
+    text, so reading a few columns never touches the others (or the PDB
+    files). Several processes can append to the same ledger; new columns
+    are backfilled with NaN, -1 or "" for earlier rows, and an integer
+    column becomes a float column once it receives a float
+
+    Example usage:
+      ledger = MetricsLedger( "sweep_ledger" )
+      ledger.append( { "outname": "out.pdb", "plddt": 85.1 } )
+      rows = ledger.query( where={ "plddt": lambda x: x > 70 } )
+
+    Private variables
+    ----------
+    self.path: Ledger directory
+    """
+
+    def __init__(self, path: str):
+
+        r"""Initialize ledger (created if it does not exist)
+
+        Parameters
+        ----------
+        path : Ledger directory
+
+        """
+
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _schema(self) -> dict:
+
+        r"""Reads the column types and committed row count
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        Dictionary with "columns" (name -> type), "sizes" (name -> committed
+        bytes) and "n_rows"
+
+        """
+
+        try:
+            with open(os.path.join(self.path, "schema.json"), "r") as infile:
+                return json.load(infile)
+        except FileNotFoundError:
+            return {"columns": {}, "sizes": {}, "n_rows": 0}
+
+    def _write_schema(self, schema: dict) -> NoReturn:
+
+        r"""Commits the schema; rows become visible to readers here
+
+        Parameters
+        ----------
+        schema : Dictionary with "columns", "sizes" and "n_rows"
+
+        Returns
+        ----------
+        None
+
+        """
+
+        tmp = os.path.join(self.path, f"schema.json.{ os.getpid() }")
+        with open(tmp, "w") as outfile:
+            json.dump(schema, outfile)
+        os.replace(tmp, os.path.join(self.path, "schema.json"))
+
+    def _column_file(self, name: str, dtype: str) -> str:
+        ext = "txt" if dtype == "str" else "bin"
+        return os.path.join(self.path, f"{ name }.{ ext }")
+
+    def _write_values(self, name: str, dtype: str, values: List[Any]) -> NoReturn:
+
+        r"""Appends values to one column file
+
+        Parameters
+        ----------
+        name : Column name
+        dtype : Column type
+        values : Values to append
+
+        Returns
+        ----------
+        None
+
+        """
+
+        if dtype == "str":
+            text = "".join(str(v).replace("\n", " ") + "\n" for v in values)
+            with open(self._column_file(name, dtype), "a") as outfile:
+                outfile.write(text)
+        else:
+            arr = np.asarray(values, dtype=f"<{ dtype }")
+            with open(self._column_file(name, dtype), "ab") as outfile:
+                outfile.write(arr.tobytes())
+
+    def _truncate(self, name: str, dtype: str, size: int) -> NoReturn:
+
+        r"""Drops uncommitted bytes left by an interrupted append
+
+        Parameters
+        ----------
+        name : Column name
+        dtype : Column type
+        size : Committed size of the column file
+
+        Returns
+        ----------
+        None
+
+        """
+
+        filename = self._column_file(name, dtype)
+        if os.path.isfile(filename) and os.path.getsize(filename) > size:
+            os.truncate(filename, size)
+
+    def _promote(self, name: str, size: int) -> NoReturn:
+
+        r"""Rewrites an integer column as floats
+
+        Parameters
+        ----------
+        name : Column name
+        size : Committed size of the column file
+
+        Returns
+        ----------
+        None
+
+        """
+
+        filename = self._column_file(name, "i8")
+        values = np.fromfile(filename, dtype="<i8", count=size // 8)
+
+        tmp = f"{ filename }.{ os.getpid() }"
+        values.astype("<f8").tofile(tmp)
+        os.replace(tmp, self._column_file(name, "f8"))
+
+    def append(self, row: Mapping[str, Any]) -> NoReturn:
+
+        r"""Appends one row
+        A float arriving in an integer column promotes the column to float;
+        a string arriving in a numeric column raises a TypeError
+
+        Parameters
+        ----------
+        row : Column name -> value (scalars only)
+
+        Returns
+        ----------
+        None
+
+        """
+
+        with open(os.path.join(self.path, "lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            schema = self._schema()
+            columns, sizes = schema["columns"], schema["sizes"]
+            n_rows = schema["n_rows"]
+
+            # Checked before anything is written, so a bad row changes nothing
+            promote = []
+            for name, value in row.items():
+                if name not in columns or value is None:
+                    continue
+                dtype = _infer_dtype(value)
+                if columns[name] == "i8" and dtype == "f8":
+                    promote.append(name)
+                elif columns[name] != "str" and dtype == "str":
+                    raise TypeError(
+                        f"Column { name } holds numbers, got { value !r}"
+                    )
+
+            for name, dtype in columns.items():
+                self._truncate(name, dtype, sizes[name])
+
+            for name in promote:
+                self._promote(name, sizes[name])
+                columns[name] = "f8"
+            if promote:
+                self._write_schema(schema)
+
+            for name, value in row.items():
+                # A column is typed by its first actual value
+                if name not in columns and value is not None:
+                    columns[name] = _infer_dtype(value)
+                    self._truncate(name, columns[name], 0)
+                    self._write_values(
+                        name, columns[name], [_MISSING[columns[name]]] * n_rows
+                    )
+
+            for name, dtype in columns.items():
+                value = row.get(name, _MISSING[dtype])
+                if value is None:
+                    value = _MISSING[dtype]
+                self._write_values(name, dtype, [value])
+                sizes[name] = os.path.getsize(self._column_file(name, dtype))
+
+            schema["n_rows"] = n_rows + 1
+            self._write_schema(schema)
+
+    def __len__(self) -> int:
+        return self._schema()["n_rows"]
+
+    def read(self, columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+
+        r"""Reads whole columns
+
+        Parameters
+        ----------
+        columns : Columns to read (default=all)
+
+        Returns
+        ----------
+        Dictionary of column name -> array (strings as object arrays)
+
+        """
+
+        # Shared lock: columns may be rewritten when promoted to float
+        with open(os.path.join(self.path, "lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+
+            schema = self._schema()
+            n_rows = schema["n_rows"]
+            names = columns if columns is not None else list(schema["columns"])
+
+            out = {}
+            for name in names:
+                dtype = schema["columns"][name]
+                filename = self._column_file(name, dtype)
+                if dtype == "str":
+                    with open(filename, "r") as infile:
+                        lines = infile.read().split("\n")[:n_rows]
+                    out[name] = np.array(lines, dtype=object)
+                else:
+                    out[name] = np.fromfile(
+                        filename, dtype=f"<{ dtype }", count=n_rows
+                    )
+
+        return out
+
+    def query(
+        self,
+        columns: Optional[List[str]] = None,
+        where: Mapping[str, Callable[[np.ndarray], np.ndarray]] = {},
+        **equals: Any,
+    ) -> Dict[str, np.ndarray]:
+
+        r"""Selects rows by column conditions
+
+        Example usage: ledger.query( [ "outname", "plddt" ], max_recycles=3 )
+
+        Parameters
+        ----------
+        columns : Columns to return (default=all)
+        where : Column name -> vectorized predicate, e.g. lambda x: x > 70
+        equals : Column name -> required value
+
+        Returns
+        ----------
+        Dictionary of column name -> array of matching rows
+
+        """
+
+        filters = list(where) + list(equals)
+        wanted = None if columns is None else list(dict.fromkeys(columns + filters))
+        data = self.read(wanted)
+
+        n_rows = len(next(iter(data.values()))) if data else 0
+        mask = np.ones(n_rows, dtype=bool)
+        for name, fn in where.items():
+            mask &= np.asarray(fn(data[name]), dtype=bool)
+        for name, value in equals.items():
+            mask &= data[name] == value
+
+        names = columns if columns is not None else list(data)
+        return {name: data[name][mask] for name in names}
@@ -1,131 +1,104 @@
+from .coordinator import SearchCoordinator
+
+import abc
 import hashlib
 import numpy as np
 import os
 import re
 import requests
+import shutil
+import subprocess
 import tarfile
 import time
 
 from absl import logging
-from typing import List, NoReturn, Tuple
+from typing import Dict, List, NoReturn, Optional, Tuple
 
 
-class MMSeqs2Runner:
+# Results every search backend provides, and the archive they may stay in
+A3M_FILES = ["uniref.a3m", "bfd.mgnify30.metaeuk30.smag30.a3m"]
+M8_FILE = "pdb70.m8"
+TAR_FILE = "out.tar.gz"
 
-    r"""Runner object
 
-    Fetches sequence alignment and templates from MMSeqs2 server
-    Based on the function run_mmseqs2 from ColabFold (sokrypton/ColabFold)
-    Version 62d7558c91a9809712b022faf9d91d8b183c328c
+class SearchBackend(abc.ABC):
 
-    Relevant publications
-    ----------
-    * "Clustering huge protein sequence sets in linear time"
-      https://doi.org/10.1038/s41467-018-04964-5
-    * "MMseqs2 enables sensitive protein sequence searching for the analysis
-      of massive data sets"
-      https://doi.org/10.1038/nbt.3988
+    r"""Interface for sequence search backends
 
-    Private variables
-    ----------
-    self.job: Job ID (five-char string)
-    self.seq: Sequence to search
-    self.host_url: URL address to ping for data
-    self.t_url: URL address to ping for templates from PDB
-    self.n_templates = Number of templates to fetch (default=20)
-    self.path: Path to use
-    self.tarfile: Compressed file archive to download
+    A backend searches one sequence and leaves the files listed in
+    A3M_FILES and M8_FILE in the job directory, either as plain files or
+    packed in TAR_FILE, in the layout returned by the public MMseqs2 server
     """
 
-    def __init__(
-        self,
-        job: str,
-        seq: str,
-        host_url: str = "https://a3m.mmseqs.com",
-        t_url: str = "https://a3m-templates.mmseqs.com/template",
-        path_suffix: str = "env",
-        n_templates: int = 20,
-    ):
+    @abc.abstractmethod
+    def search(self, seq: str, path: str) -> NoReturn:
 
-        r"""Initialize runner object
+        r"""Run the search and write results
 
         Parameters
         ----------
-        job : Job name
         seq : Amino acid sequence
-        host_url : Website to ping for sequence data
-        t_url : Website to ping for template info
-        path_suffix : Suffix for path info
-
-        """
+        path : Job directory
 
-        # Clean up sequence
-        self.seq = self._cleanseq(seq.upper())
+        Returns
+        ----------
+        None
 
-        # Come up with unique job ID for MMSeqs
-        self.job = self._define_jobname(job)
+        """
 
-        # Save everything else
-        self.host_url = host_url
-        self.t_url = t_url
-        self.n_templates = n_templates
 
-        self.path = "_".join((self.job, path_suffix))
+class MMSeqs2API(SearchBackend):
 
-        if not os.path.isdir(self.path):
-            os.system(f"mkdir { self.path }")
+    r"""Searches using the public MMseqs2 server
 
-        self.tarfile = f"{ self.path }/out.tar.gz"
+    Private variables
+    ----------
+    self.host_url: URL address to ping for data
+    self.coordinator: Shares tickets and rate limits with other processes
+    """
 
-    def _cleanseq(self, seq) -> str:
+    def __init__(
+        self,
+        host_url: str = "https://a3m.mmseqs.com",
+        coordinator: SearchCoordinator = None,
+    ):
 
-        r"""Cleans the sequence to remove whitespace and noncanonical letters
+        r"""Initialize backend
 
         Parameters
         ----------
-        seq : Amino acid sequence (only all 20 here)
-
-        Returns
-        ----------
-        Cleaned up amin acid sequence
+        host_url : Website to ping for sequence data
+        coordinator : Shared coordinator (default=none, process acts alone)
 
         """
 
-        if any([aa in seq for aa in "BJOUXZ"]):
-            logging.warning("Sequence contains non-canonical amino acids!")
-            logging.warning("Removing B, J, O, U, X, and Z from sequence")
-            seq = re.sub(r"[BJOUXZ]", "", seq)
+        self.host_url = host_url
+        self.coordinator = coordinator
 
-        return re.sub(r"[^A-Z]", "", "".join(seq.split()))
+    def _throttle(self) -> NoReturn:
 
-    def _define_jobname(self, job: str) -> str:
-
-        r"""Provides a unique five-digit identifier for the job name
+        r"""Wait for the shared request budget, if any
 
         Parameters
         ----------
-        job : Job name
+        None
 
         Returns
         ----------
-        Defined job name
+        None
 
         """
 
-        return "_".join(
-            (
-                re.sub(r"\W+", "", "".join(job.split())),
-                hashlib.sha1(self.seq.encode()).hexdigest()[:5],
-            )
-        )
+        if self.coordinator is not None:
+            self.coordinator.throttle()
 
-    def _submit(self) -> dict:
+    def _submit(self, seq: str) -> dict:
 
         r"""Submit job to MMSeqs2 server
 
         Parameters
         ----------
-        None
+        seq : Amino acid sequence
 
         Returns
         ----------
@@ -133,8 +106,9 @@ class MMSeqs2Runner:
 
         """
 
-        data = {"q": f">101\n{ self.seq }", "mode": "env"}
+        data = {"q": f">101\n{ seq }", "mode": "env"}
 
+        self._throttle()
         res = requests.post(f"{ self.host_url }/ticket/msa", data=data)
 
         try:
@@ -159,6 +133,7 @@ class MMSeqs2Runner:
 
         """
 
+        self._throttle()
         res = requests.get(f"{ self.host_url }/ticket/{ idx }")
 
         try:
@@ -184,19 +159,21 @@ class MMSeqs2Runner:
 
         """
 
+        self._throttle()
         res = requests.get(f"{ self.host_url }/result/download/{ idx }")
 
         with open(path, "wb") as out:
             out.write(res.content)
 
-    def _search_mmseqs2(self) -> NoReturn:
+    def _search_mmseqs2(self, seq: str, tar_path: str) -> NoReturn:
 
         r"""Run the search and download results
         Heavily modified from ColabFold
 
         Parameters
         ----------
-        None
+        seq : Amino acid sequence
+        tar_path : Compressed file archive to download
 
         Returns
         ----------
@@ -204,16 +181,16 @@ class MMSeqs2Runner:
 
         """
 
-        if os.path.isfile(self.tarfile):
+        if os.path.isfile(tar_path):
             return
 
-        out = self._submit()
+        out = self._submit(seq)
 
         time.sleep(5 + np.random.randint(0, 5))
         while out["status"] in ["UNKNOWN", "RATELIMIT"]:
             # resubmit
             time.sleep(5 + np.random.randint(0, 5))
-            out = self._submit()
+            out = self._submit(seq)
 
         logging.debug(f"ID: { out[ 'id' ] }")
 
@@ -222,7 +199,7 @@ class MMSeqs2Runner:
             out = self._status(out["id"])
 
         if out["status"] == "COMPLETE":
-            self._download(out["id"], self.tarfile)
+            self._download(out["id"], tar_path)
 
         elif out["status"] == "ERROR":
             raise RuntimeError(
@@ -235,6 +212,541 @@ class MMSeqs2Runner:
                 )
             )
 
+    def _coordinated_search(self, seq: str, tar_path: str) -> NoReturn:
+
+        r"""Run the search unless another process already is
+        Only the first process to claim a sequence submits a ticket;
+        the others copy its published archive
+
+        Parameters
+        ----------
+        seq : Amino acid sequence
+        tar_path : Compressed file archive to download
+
+        Returns
+        ----------
+        None
+
+        """
+
+        key = self.coordinator.key(seq)
+
+        while not os.path.isfile(tar_path):
+
+            shared = self.coordinator.result(key)
+            if shared:
+                logging.debug(f"Reusing MMseqs2 results { key }")
+                shutil.copyfile(shared, tar_path)
+
+            elif self.coordinator.claim(key):
+                try:
+                    self._search_mmseqs2(seq, tar_path)
+                except BaseException:
+                    self.coordinator.release(key)
+                    raise
+                if not os.path.isfile(tar_path):
+                    self.coordinator.release(key)
+                    break
+                self.coordinator.publish(key, tar_path)
+
+            else:
+                logging.debug(f"Waiting on MMseqs2 results { key }")
+                self.coordinator.wait(key)
+
+    def search(self, seq: str, path: str) -> NoReturn:
+
+        r"""Run the search and download results
+        The archive is left compressed; MMSeqs2Runner reads only the
+        members it needs
+
+        Parameters
+        ----------
+        seq : Amino acid sequence
+        path : Job directory
+
+        Returns
+        ----------
+        None
+
+        """
+
+        tar_path = os.path.join(path, TAR_FILE)
+        if self.coordinator is None:
+            self._search_mmseqs2(seq, tar_path)
+        else:
+            self._coordinated_search(seq, tar_path)
+
+
+class LocalMMSeqs2(SearchBackend):
+
+    r"""Searches using a locally installed mmseqs binary
+    Runs the same steps as colabfold_search (and the MMseqs2 server): an
+    iterative profile search of UniRef30, expanded through its cluster
+    members (expandaln/align/filterresult), the same for the environmental
+    database, and a template search with the UniRef30 profile. The
+    databases are those built by ColabFold's setup_databases.sh, i.e. each
+    has _seq and _aln companions
+
+    Private variables
+    ----------
+    self.uniref_db: MMseqs2 database to search for uniref.a3m
+    self.env_db: MMseqs2 database to search for the environmental a3m
+    self.pdb_db: MMseqs2 database to search for pdb70.m8
+    self.binary: mmseqs executable (or stand-in with the same interface)
+    self.threads: Number of threads given to mmseqs
+    self.search_args: Extra arguments passed to each mmseqs search
+    """
+
+    # Settings used by colabfold_search
+    SEARCH_ARGS = ["--num-iterations", "3", "-a", "-e", "0.1", "--max-seqs", "10000"]
+    FILTER_ARGS = [
+        "--filter-msa",
+        "1",
+        "--filter-min-enable",
+        "1000",
+        "--diff",
+        "3000",
+        "--qid",
+        "0.0,0.2,0.4,0.6,0.8,1.0",
+        "--qsc",
+        "0",
+        "--max-seq-id",
+        "0.95",
+    ]
+    M8_FORMAT = (
+        "query,target,fident,alnlen,mismatch,gapopen,"
+        "qstart,qend,tstart,tend,evalue,bits,cigar"
+    )
+
+    def __init__(
+        self,
+        uniref_db: str,
+        env_db: str,
+        pdb_db: str,
+        binary: str = "mmseqs",
+        threads: int = 1,
+        search_args: List[str] = [],
+    ):
+
+        r"""Initialize backend
+
+        Parameters
+        ----------
+        uniref_db : Path to UniRef30 database (e.g. uniref30_2103_db)
+        env_db : Path to environmental database (e.g. colabfold_envdb_202108_db)
+        pdb_db : Path to PDB70 database
+        binary : mmseqs executable
+        threads : Number of threads given to mmseqs
+        search_args : Extra arguments passed to each mmseqs search
+
+        """
+
+        self.uniref_db = uniref_db
+        self.env_db = env_db
+        self.pdb_db = pdb_db
+        self.binary = binary
+        self.threads = threads
+        self.search_args = list(search_args)
+
+    def _run(self, *args: str, threads: bool = True) -> NoReturn:
+
+        r"""Run one mmseqs module
+
+        Parameters
+        ----------
+        args : Module name and its arguments
+        threads : Whether the module takes --threads
+
+        Returns
+        ----------
+        None
+
+        """
+
+        cmd = [self.binary, *args]
+        if threads:
+            cmd += ["--threads", str(self.threads)]
+        logging.debug(" ".join(cmd))
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+
+    def _expand(
+        self, work: str, query: str, profile: str, db: str, res: str, name: str
+    ) -> str:
+
+        r"""Expands search hits through their cluster members into an MSA
+
+        Parameters
+        ----------
+        work : Work directory
+        query : Query database of the search
+        profile : Profile used to realign the members
+        db : Searched database (with _seq and _aln companions)
+        res : Search result database
+        name : Prefix for intermediate databases
+
+        Returns
+        ----------
+        Path to the a3m database
+
+        """
+
+        qdb = os.path.join(work, "qdb")
+        exp = os.path.join(work, f"{ name }_exp")
+        realign = os.path.join(work, f"{ name }_exp_realign")
+        filtered = os.path.join(work, f"{ name }_exp_realign_filter")
+        msa = os.path.join(work, f"{ name }_msa")
+
+        # colabfold_search only filters the UniRef30 clusters while expanding
+        expand_args = ["--expansion-mode", "0", "-e", "inf"]
+        if query == qdb:
+            expand_args += ["--expand-filter-clusters", "1", "--max-seq-id", "0.95"]
+
+        self._run(
+            "expandaln", query, f"{ db }_seq", res, f"{ db }_aln", exp, *expand_args
+        )
+        self._run(
+            "align",
+            profile,
+            f"{ db }_seq",
+            exp,
+            realign,
+            "-e",
+            "10",
+            "--max-accept",
+            "1000000",
+            "--alt-ali",
+            "10",
+            "-a",
+        )
+        self._run(
+            "filterresult",
+            qdb,
+            f"{ db }_seq",
+            realign,
+            filtered,
+            "--qid",
+            "0",
+            "--qsc",
+            "-20.0",
+            "--diff",
+            "0",
+            "--max-seq-id",
+            "1.0",
+            "--filter-min-enable",
+            "100",
+        )
+        self._run(
+            "result2msa",
+            qdb,
+            f"{ db }_seq",
+            filtered,
+            msa,
+            "--msa-format-mode",
+            "6",
+            *self.FILTER_ARGS,
+        )
+
+        return msa
+
+    def _unpack(self, db: str, outname: str) -> NoReturn:
+
+        r"""Unpacks a single-query result database to a plain file
+
+        Parameters
+        ----------
+        db : Result database
+        outname : File to write
+
+        Returns
+        ----------
+        None
+
+        """
+
+        out_dir = f"{ db }_unpacked"
+        os.makedirs(out_dir, exist_ok=True)
+        self._run("unpackdb", db, out_dir, "--unpack-name-mode", "0", threads=False)
+
+        # One entry, named by the query's key; no entry means no hits
+        with open(outname, "w") as outfile:
+            for entry in sorted(os.listdir(out_dir)):
+                with open(os.path.join(out_dir, entry), "r") as infile:
+                    outfile.write(infile.read().replace("\x00", ""))
+
+    def search(self, seq: str, path: str) -> NoReturn:
+
+        r"""Run the searches and write results
+
+        Parameters
+        ----------
+        seq : Amino acid sequence
+        path : Job directory
+
+        Returns
+        ----------
+        None
+
+        """
+
+        work = os.path.join(path, "mmseqs")
+        os.makedirs(work, exist_ok=True)
+
+        # Intermediate databases are removed even if a step fails
+        try:
+            with open(os.path.join(work, "query.fasta"), "w") as outfile:
+                outfile.write(f">101\n{ seq }\n")
+
+            qdb = os.path.join(work, "qdb")
+            self._run(
+                "createdb", os.path.join(work, "query.fasta"), qdb, threads=False
+            )
+
+            # UniRef30: iterative search, keeping the final query profile
+            res = os.path.join(work, "res")
+            tmp = os.path.join(work, "tmp")
+            self._run(
+                "search",
+                qdb,
+                self.uniref_db,
+                res,
+                tmp,
+                *self.SEARCH_ARGS,
+                *self.search_args,
+            )
+            profile = os.path.join(work, "prof_res")
+            self._run(
+                "mvdb", os.path.join(tmp, "latest", "profile_1"), profile, threads=False
+            )
+            self._run("lndb", f"{ qdb }_h", f"{ profile }_h", threads=False)
+            msa = self._expand(work, qdb, profile, self.uniref_db, res, "uniref")
+            self._unpack(msa, os.path.join(path, A3M_FILES[0]))
+
+            # Templates, searched with the UniRef30 profile
+            res = os.path.join(work, "res_pdb")
+            self._run(
+                "search",
+                profile,
+                self.pdb_db,
+                res,
+                os.path.join(work, "tmp2"),
+                "-s",
+                "7.5",
+                "-a",
+                "-e",
+                "0.1",
+                *self.search_args,
+            )
+            m8 = os.path.join(work, "pdb70")
+            self._run(
+                "convertalis",
+                profile,
+                self.pdb_db,
+                res,
+                m8,
+                "--format-output",
+                self.M8_FORMAT,
+                "--db-output",
+                "1",
+            )
+            self._unpack(m8, os.path.join(path, M8_FILE))
+
+            # Environmental sequences, searched with the UniRef30 profile
+            res = os.path.join(work, "res_env")
+            tmp = os.path.join(work, "tmp3")
+            self._run(
+                "search",
+                profile,
+                self.env_db,
+                res,
+                tmp,
+                *self.SEARCH_ARGS,
+                *self.search_args,
+            )
+            env_profile = os.path.join(tmp, "latest", "profile_1")
+            msa = self._expand(work, profile, env_profile, self.env_db, res, "env")
+            self._unpack(msa, os.path.join(path, A3M_FILES[1]))
+
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+class MMSeqs2Runner:
+
+    r"""Runner object
+
+    Fetches sequence alignment and templates from MMSeqs2 server
+    Based on the function run_mmseqs2 from ColabFold (sokrypton/ColabFold)
+    Version 62d7558c91a9809712b022faf9d91d8b183c328c
+
+    Relevant publications
+    ----------
+    * "Clustering huge protein sequence sets in linear time"
+      https://doi.org/10.1038/s41467-018-04964-5
+    * "MMseqs2 enables sensitive protein sequence searching for the analysis
+      of massive data sets"
+      https://doi.org/10.1038/nbt.3988
+
+    Private variables
+    ----------
+    self.job: Job ID (five-char string)
+    self.seq: Sequence to search
+    self.backend: SearchBackend used to fetch alignments
+    self.t_url: URL address to ping for templates from PDB
+    self.n_templates = Number of templates to fetch (default=20)
+    self.path: Path to use
+    self._results: Search results read into memory, keyed by file name
+    """
+
+    def __init__(
+        self,
+        job: str,
+        seq: str,
+        host_url: str = "https://a3m.mmseqs.com",
+        t_url: str = "https://a3m-templates.mmseqs.com/template",
+        path_suffix: str = "env",
+        n_templates: int = 20,
+        backend: Optional[SearchBackend] = None,
+    ):
+
+        r"""Initialize runner object
+
+        Parameters
+        ----------
+        job : Job name
+        seq : Amino acid sequence
+        host_url : Website to ping for sequence data
+        t_url : Website to ping for template info
+        path_suffix : Suffix for path info
+        n_templates : Number of templates to fetch
+        backend : Search backend (default=MMSeqs2API at host_url)
+
+        """
+
+        # Clean up sequence
+        self.seq = self._cleanseq(seq.upper())
+
+        # Come up with unique job ID for MMSeqs
+        self.job = self._define_jobname(job)
+
+        # Save everything else
+        self.backend = backend or MMSeqs2API(host_url)
+        self.t_url = t_url
+        self.n_templates = n_templates
+
+        self.path = "_".join((self.job, path_suffix))
+
+        if not os.path.isdir(self.path):
+            os.system(f"mkdir { self.path }")
+
+        self._results = {}
+
+    def _cleanseq(self, seq) -> str:
+
+        r"""Cleans the sequence to remove whitespace and noncanonical letters
+
+        Parameters
+        ----------
+        seq : Amino acid sequence (only all 20 here)
+
+        Returns
+        ----------
+        Cleaned up amin acid sequence
+
+        """
+
+        if any([aa in seq for aa in "BJOUXZ"]):
+            logging.warning("Sequence contains non-canonical amino acids!")
+            logging.warning("Removing B, J, O, U, X, and Z from sequence")
+            seq = re.sub(r"[BJOUXZ]", "", seq)
+
+        return re.sub(r"[^A-Z]", "", "".join(seq.split()))
+
+    def _define_jobname(self, job: str) -> str:
+
+        r"""Provides a unique five-digit identifier for the job name
+
+        Parameters
+        ----------
+        job : Job name
+
+        Returns
+        ----------
+        Defined job name
+
+        """
+
+        return "_".join(
+            (
+                re.sub(r"\W+", "", "".join(job.split())),
+                hashlib.sha1(self.seq.encode()).hexdigest()[:5],
+            )
+        )
+
+    def _has_results(self) -> bool:
+
+        r"""Checks whether search results are already in the job directory
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        True if all results exist as plain files or in the archive
+
+        """
+
+        names = A3M_FILES + [M8_FILE]
+        return all(
+            os.path.isfile(os.path.join(self.path, f)) for f in names
+        ) or os.path.isfile(os.path.join(self.path, TAR_FILE))
+
+    def _read_results(self) -> Dict[str, str]:
+
+        r"""Reads search results into memory
+        Plain files in the job directory take precedence; anything else is
+        streamed out of the archive in one pass without extracting it
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        Dictionary mapping file names to contents
+
+        """
+
+        if self._results:
+            return self._results
+
+        wanted = set()
+        for name in A3M_FILES + [M8_FILE]:
+            filename = os.path.join(self.path, name)
+            if os.path.isfile(filename):
+                with open(filename, "r") as infile:
+                    self._results[name] = infile.read()
+            else:
+                wanted.add(name)
+
+        if len(wanted) > 0:
+            with tarfile.open(os.path.join(self.path, TAR_FILE), "r|gz") as tar_gz:
+                for member in tar_gz:
+                    name = os.path.basename(member.name)
+                    if name in wanted and member.isfile():
+                        data = tar_gz.extractfile(member).read()
+                        self._results[name] = data.decode()
+                        wanted.remove(name)
+                    if len(wanted) == 0:
+                        break
+
+        if len(wanted) > 0:
+            raise FileNotFoundError(
+                f"Missing MMseqs2 results in { self.path }: { sorted(wanted) }"
+            )
+
+        return self._results
+
     def process_templates(self, templates: List[str] = []) -> str:
 
         r"""Process templates and fetch from MMSeqs2 server
@@ -258,15 +770,15 @@ class MMSeqs2Runner:
         logging.info("\t".join(("seq", "pdb", "cid", "evalue")))
 
         pdbs = []
-        with open(f"{ self.path }/pdb70.m8", "r") as infile:
-
-            for line in infile:
+        for line in self._read_results()[M8_FILE].splitlines():
 
-                sl = line.rstrip().split()
-                pdb = sl[1]
-                if pdb in templates:
-                    pdbs.append(sl[1])
-                    logging.info(f"{ sl[0] }\t{ sl[1] }\t{ sl[2] }\t{ sl[10] }")
+            sl = line.rstrip().split()
+            if len(sl) == 0:
+                continue
+            pdb = sl[1]
+            if pdb in templates:
+                pdbs.append(sl[1])
+                logging.info(f"{ sl[0] }\t{ sl[1] }\t{ sl[2] }\t{ sl[10] }")
 
         if len(pdbs) == 0:
             logging.warning("No templates found.")
@@ -301,8 +813,8 @@ class MMSeqs2Runner:
 
         Parameters
         ----------
-        a3m_files : List of files to parse
-        token : Token to look for when parsing
+        a3m_files : List of result files to parse
+        templates : PDB IDs to use as templates
 
         Returns
         ----------
@@ -310,12 +822,9 @@ class MMSeqs2Runner:
 
         """
 
-        a3m_lines = ""
-
-        for a3m_file in a3m_files:
-            for line in open(os.path.join(self.path, a3m_file), "r"):
-                if len(line) > 0:
-                    a3m_lines += line.replace("\x00", "")
+        results = self._read_results()
+        a3m_lines = "".join(results[a3m_file] for a3m_file in a3m_files)
+        a3m_lines = a3m_lines.replace("\x00", "")
 
         return a3m_lines, self.process_templates(templates)
 
@@ -334,13 +843,8 @@ class MMSeqs2Runner:
 
         """
 
-        self._search_mmseqs2()
-
-        a3m_files = ["uniref.a3m", "bfd.mgnify30.metaeuk30.smag30.a3m"]
-
-        # extract a3m files
-        if not os.path.isfile(os.path.join(self.path, a3m_files[0])):
-            with tarfile.open(self.tarfile) as tar_gz:
-                tar_gz.extractall(self.path)
+        # Search unless results are already in the job directory
+        if not self._has_results():
+            self.backend.search(self.seq, self.path)
 
-        return self._process_alignment(a3m_files, templates)
+        return self._process_alignment(A3M_FILES, templates)
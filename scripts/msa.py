@@ -0,0 +1,334 @@
+import concurrent.futures
+import numpy as np
+import os
+
+from typing import Callable, List, Optional, Tuple
+
+# Residue encoding: 20 canonical amino acids, then unknown, then gap
+AA = "ARNDCQEGHILKMFPSTWYV"
+UNK = len(AA)
+GAP = UNK + 1
+
+_LOOKUP = np.full(256, UNK, dtype=np.uint8)
+for i, aa in enumerate(AA):
+    _LOOKUP[ord(aa)] = i
+_LOOKUP[ord("-")] = GAP
+
+_LOWERCASE = bytes(range(ord("a"), ord("z") + 1))
+
+
+def encode_a3m(a3m_lines: str) -> Tuple[List[str], List[str], np.ndarray]:
+
+    r"""Encodes an alignment as a uint8 matrix
+    Insertions (lowercase letters) are dropped so that every row has one
+    column per query residue
+
+    Parameters
+    ----------
+    a3m_lines : String of entire alignment
+
+    Returns
+    ----------
+    Tuple with [0] headers, [1] original sequence lines,
+    and [2] (n_seqs, n_res) uint8 matrix
+
+    """
+
+    headers, seqs = [], []
+    for line in a3m_lines.split("\n"):
+        line = line.strip()
+        if line.startswith(">"):
+            headers.append(line)
+            seqs.append("")
+        elif len(line) > 0 and len(headers) > 0:
+            seqs[-1] += line
+
+    rows = [s.encode().translate(None, _LOWERCASE) for s in seqs]
+    if len(rows) == 0:
+        raise ValueError("Alignment contains no sequences")
+    if len(set(map(len, rows))) > 1:
+        raise ValueError("Alignment rows differ in length after removing insertions")
+
+    matrix = _LOOKUP[np.frombuffer(b"".join(rows), dtype=np.uint8)]
+    return headers, seqs, matrix.reshape(len(rows), -1)
+
+
+def _onehot(block: np.ndarray, dtype: type = np.float32) -> np.ndarray:
+
+    r"""Flattened one-hot encoding over the 20 canonical residues
+
+    Parameters
+    ----------
+    block : (n, n_res) uint8 matrix
+    dtype : Output type
+
+    Returns
+    ----------
+    (n, n_res * 20) matrix
+
+    """
+
+    out = np.zeros((*block.shape, UNK), dtype=dtype)
+    rows, cols = np.nonzero(block < UNK)
+    out[rows, cols, block[rows, cols]] = 1.0
+    return out.reshape(len(block), -1)
+
+
+def _identity(
+    onehot_a: np.ndarray,
+    len_a: np.ndarray,
+    onehot_b: np.ndarray,
+    len_b: np.ndarray,
+) -> np.ndarray:
+
+    r"""Sequence identity between two blocks of an alignment
+    Identical residues are normalized by the length of the shorter
+    sequence (non-gap positions), as in hhfilter
+
+    Parameters
+    ----------
+    onehot_a : One-hot encoded block
+    len_a : Number of non-gap positions per row of block a
+    onehot_b : One-hot encoded block
+    len_b : Number of non-gap positions per row of block b
+
+    Returns
+    ----------
+    (len(a), len(b)) float32 identity matrix
+
+    """
+
+    matches = onehot_a @ onehot_b.T
+    return matches / np.maximum(np.minimum.outer(len_a, len_b), 1)
+
+
+def _map_blocks(
+    fn: Callable[[slice], np.ndarray], n: int, block_size: int, n_threads: int
+) -> List[np.ndarray]:
+
+    r"""Applies fn to consecutive row slices in a thread pool
+
+    Parameters
+    ----------
+    fn : Function of a row slice
+    n : Number of rows
+    block_size : Rows per slice
+    n_threads : Number of worker threads
+
+    Returns
+    ----------
+    List of results, in row order
+
+    """
+
+    blocks = [slice(i, min(i + block_size, n)) for i in range(0, n, block_size)]
+    if n_threads <= 1 or len(blocks) == 1:
+        return [fn(b) for b in blocks]
+
+    with concurrent.futures.ThreadPoolExecutor(n_threads) as pool:
+        return list(pool.map(fn, blocks))
+
+
+def pairwise_identity(
+    msa: np.ndarray, block_size: int = 512, n_threads: Optional[int] = None
+) -> np.ndarray:
+
+    r"""Computes the full pairwise identity matrix
+    Memory scales with n_seqs squared; use filter_redundant or
+    sequence_weights for very deep alignments
+
+    Parameters
+    ----------
+    msa : (n_seqs, n_res) uint8 matrix from encode_a3m
+    block_size : Rows per block
+    n_threads : Number of worker threads (default=all cores)
+
+    Returns
+    ----------
+    (n_seqs, n_seqs) float32 identity matrix
+
+    """
+
+    n_threads = n_threads or os.cpu_count()
+    lengths = (msa != GAP).sum(1)
+    onehot = _onehot(msa)
+
+    def fn(rows):
+        return _identity(onehot[rows], lengths[rows], onehot, lengths)
+
+    return np.concatenate(_map_blocks(fn, len(msa), block_size, n_threads))
+
+
+def sequence_weights(
+    msa: np.ndarray,
+    threshold: float = 0.8,
+    block_size: int = 512,
+    n_threads: Optional[int] = None,
+) -> np.ndarray:
+
+    r"""Weights each sequence by the inverse size of its neighbourhood
+    Each block is one-hot encoded once and kept as uint8, a quarter of
+    the memory of pairwise_identity's float32 encoding
+
+    Parameters
+    ----------
+    msa : (n_seqs, n_res) uint8 matrix from encode_a3m
+    threshold : Identity at or above which two sequences are neighbours
+    block_size : Rows per block
+    n_threads : Number of worker threads (default=all cores)
+
+    Returns
+    ----------
+    (n_seqs,) float32 weights
+
+    """
+
+    n_threads = n_threads or os.cpu_count()
+    lengths = (msa != GAP).sum(1)
+
+    blocks = _map_blocks(
+        lambda rows: _onehot(msa[rows], np.uint8), len(msa), block_size, n_threads
+    )
+
+    def fn(rows):
+        onehot = blocks[rows.start // block_size].astype(np.float32)
+        counts = np.zeros(len(onehot), dtype=np.int64)
+        for i, block in enumerate(blocks):
+            cols = slice(i * block_size, (i + 1) * block_size)
+            ident = _identity(
+                onehot, lengths[rows], block.astype(np.float32), lengths[cols]
+            )
+            counts += (ident >= threshold).sum(1)
+        return counts
+
+    counts = np.concatenate(_map_blocks(fn, len(msa), block_size, n_threads))
+    return (1.0 / np.maximum(counts, 1)).astype(np.float32)
+
+
+def filter_coverage(
+    msa: np.ndarray, min_coverage: float = 0.0, min_query_id: float = 0.0
+) -> np.ndarray:
+
+    r"""Flags sequences that cover and resemble the query (first row)
+
+    Parameters
+    ----------
+    msa : (n_seqs, n_res) uint8 matrix from encode_a3m
+    min_coverage : Minimum fraction of query residues aligned
+    min_query_id : Minimum sequence identity with the query
+
+    Returns
+    ----------
+    Boolean mask over sequences (query is always kept)
+
+    """
+
+    query = msa[0] < UNK
+    aligned = msa != GAP
+    coverage = (aligned & query).sum(1) / max(query.sum(), 1)
+
+    matches = ((msa == msa[0]) & query).sum(1)
+    query_id = matches / np.maximum(np.minimum(aligned.sum(1), query.sum()), 1)
+
+    mask = (coverage >= min_coverage) & (query_id >= min_query_id)
+    mask[0] = True
+    return mask
+
+
+def filter_redundant(
+    msa: np.ndarray,
+    max_seq_id: float = 0.9,
+    block_size: int = 512,
+    n_threads: Optional[int] = None,
+) -> np.ndarray:
+
+    r"""Greedy redundancy reduction in the manner of hhfilter -id
+    Sequences are visited in order and kept if no previously kept
+    sequence exceeds max_seq_id identity with them. Candidates are
+    screened against kept sequences one block at a time
+
+    Parameters
+    ----------
+    msa : (n_seqs, n_res) uint8 matrix from encode_a3m
+    max_seq_id : Maximum pairwise identity among kept sequences
+    block_size : Rows per block
+    n_threads : Number of worker threads (default=all cores)
+
+    Returns
+    ----------
+    Indices of kept sequences, in input order
+
+    """
+
+    n_threads = n_threads or os.cpu_count()
+    lengths = (msa != GAP).sum(1)
+    keep = np.zeros(0, dtype=np.int64)
+
+    for start in range(0, len(msa), block_size):
+        cand = np.arange(start, min(start + block_size, len(msa)))
+        onehot = _onehot(msa[cand])
+
+        # Screen against everything kept so far
+        if len(keep) > 0:
+
+            def fn(cols):
+                idx = keep[cols]
+                return _identity(
+                    onehot, lengths[cand], _onehot(msa[idx]), lengths[idx]
+                ).max(1)
+
+            max_id = np.max(_map_blocks(fn, len(keep), block_size, n_threads), 0)
+            sel = max_id <= max_seq_id
+            cand, onehot = cand[sel], onehot[sel]
+
+        # Resolve the remaining candidates against each other
+        ident = _identity(onehot, lengths[cand], onehot, lengths[cand])
+        accepted = []
+        for i in range(len(cand)):
+            if not np.any(ident[i, accepted] > max_seq_id):
+                accepted.append(i)
+
+        keep = np.concatenate((keep, cand[accepted]))
+
+    return keep
+
+
+def filter_a3m(
+    a3m_lines: str,
+    max_seq_id: float = 0.9,
+    min_coverage: float = 0.0,
+    min_query_id: float = 0.0,
+    max_seqs: int = -1,
+    block_size: int = 512,
+    n_threads: Optional[int] = None,
+) -> str:
+
+    r"""Reduces an alignment to a diverse subset
+    Replaces an external call to hhfilter, e.g. to pick 16-128 sequences
+    before util.setup_features
+
+    Parameters
+    ----------
+    a3m_lines : String of entire alignment
+    max_seq_id : Maximum pairwise identity among kept sequences
+    min_coverage : Minimum fraction of query residues aligned
+    min_query_id : Minimum sequence identity with the query
+    max_seqs : Keep at most this many sequences, query included (-1=all)
+    block_size : Rows per block
+    n_threads : Number of worker threads (default=all cores)
+
+    Returns
+    ----------
+    Filtered alignment (as string), with original insertions retained
+
+    """
+
+    headers, seqs, matrix = encode_a3m(a3m_lines)
+
+    idx = np.nonzero(filter_coverage(matrix, min_coverage, min_query_id))[0]
+    idx = idx[filter_redundant(matrix[idx], max_seq_id, block_size, n_threads)]
+
+    if max_seqs > 0:
+        idx = idx[:max_seqs]
+
+    return "".join(f"{ headers[i] }\n{ seqs[i] }\n" for i in idx)
@@ -0,0 +1,123 @@
+import json
+import numpy as np
+import os
+import shutil
+import tempfile
+
+from alphafold.model import data
+
+from absl import logging
+from typing import Dict, List, NoReturn
+
+MODEL_NAMES = [f"model_{ i }_ptm" for i in range(1, 6)]
+
+# Parameters already mapped into this process, keyed by model name
+_params = {}
+
+
+def _mmap_dir(model_name: str, data_dir: str) -> str:
+    return os.path.join(data_dir, "params", "mmap", model_name)
+
+
+def convert_params(
+    data_dir: str = ".", model_names: List[str] = MODEL_NAMES
+) -> NoReturn:
+
+    r"""Converts AlphaFold parameters to memory-mappable .npy files
+    Only needs to be run once; params/params_<name>.npz is unpacked to
+    params/mmap/<name>/, which get_model_haiku_params then prefers.
+    Safe to run while other processes are converting or reading
+
+    Parameters
+    ----------
+    data_dir : Directory containing params/
+    model_names : Models to convert (default=the five pTM models)
+
+    Returns
+    ----------
+    None
+
+    """
+
+    for model_name in model_names:
+
+        out_dir = _mmap_dir(model_name, data_dir)
+        if os.path.isfile(os.path.join(out_dir, "index.json")):
+            continue
+
+        os.makedirs(os.path.dirname(out_dir), exist_ok=True)
+        npz = os.path.join(data_dir, "params", f"params_{ model_name }.npz")
+        logging.info(f"Converting { npz }")
+
+        # Converted privately and renamed into place, so files that other
+        # processes have memory-mapped are never rewritten
+        tmp_dir = tempfile.mkdtemp(
+            prefix=f".{ model_name }.", dir=os.path.dirname(out_dir)
+        )
+        try:
+            index = {}
+            with np.load(npz, allow_pickle=False) as flat:
+                for i, key in enumerate(flat.files):
+                    index[key] = f"{ i }.npy"
+                    np.save(os.path.join(tmp_dir, index[key]), flat[key])
+
+            with open(os.path.join(tmp_dir, "index.json"), "w") as outfile:
+                json.dump(index, outfile)
+            os.chmod(tmp_dir, 0o755)
+
+            try:
+                os.replace(tmp_dir, out_dir)
+            except OSError:
+                # Another process finished converting first
+                if not os.path.isfile(os.path.join(out_dir, "index.json")):
+                    raise
+
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def get_model_haiku_params(
+    model_name: str, data_dir: str = "."
+) -> Dict[str, Dict[str, np.ndarray]]:
+
+    r"""Loads AlphaFold parameters by model name
+    Converted parameters are memory-mapped read-only, so every process
+    shares one page-cached copy and no array is read until it is used.
+    Falls back to alphafold.model.data if they have not been converted
+
+    Parameters
+    ----------
+    model_name : e.g. model_1_ptm
+    data_dir : Directory containing params/
+
+    Returns
+    ----------
+    Haiku parameter dictionary
+
+    """
+
+    key = (model_name, os.path.abspath(data_dir))
+    if key in _params:
+        return _params[key]
+
+    mmap_dir = _mmap_dir(model_name, data_dir)
+    index_file = os.path.join(mmap_dir, "index.json")
+
+    if not os.path.isfile(index_file):
+        logging.debug(f"{ model_name } not converted; see convert_params")
+        return data.get_model_haiku_params(model_name=model_name, data_dir=data_dir)
+
+    with open(index_file, "r") as infile:
+        index = json.load(infile)
+
+    # Same nesting as alphafold.model.utils.flat_params_to_haiku, but the
+    # arrays stay memory-mapped instead of being copied to device
+    params = {}
+    for path, filename in index.items():
+        scope, name = path.split("//")
+        params.setdefault(scope, {})[name] = np.load(
+            os.path.join(mmap_dir, filename), mmap_mode="r"
+        )
+
+    _params[key] = params
+    return params
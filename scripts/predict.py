@@ -1,20 +1,25 @@
+from . import compilation_cache
+from . import metrics
+from . import param_store
+from . import processing
+from . import template_library
 from . import util
+
 import os
 import numpy as np
 import random
 import sys
+import time
 
 import alphafold
 from alphafold.common import protein
-from alphafold.model import data
 from alphafold.model import config
 from alphafold.model import model
 
-from typing import Any, List, Mapping, NoReturn
+from typing import Any, List, Mapping, NoReturn, Tuple, Union
 
 from absl import logging
 import jax.numpy as jnp
-import jax
 
 def set_config(
     use_templates: bool,
@@ -94,7 +99,8 @@ def set_config(
     cfg.data.common.reduce_msa_clusters_by_max_templates = t
     cfg.data.eval.subsample_templates = t
 
-    p = data.get_model_haiku_params(model_name=name, data_dir=".")
+    # Memory-mapped and shared between processes once converted
+    p = param_store.get_model_haiku_params(name, data_dir=".")
 
     logging.debug("Prediction parameters:")
     logging.debug("\tModel ID: {}".format(model_id))
@@ -119,8 +125,74 @@ def set_config(
     return model.RunModel(cfg, p)
 
 
+def metrics_row(
+    runner: model.RunModel,
+    features_in: dict,
+    result: Mapping[str, Any],
+    random_seed: int,
+    outname: str,
+    timings: Mapping[str, float] = {},
+    regions: Mapping[str, Tuple[int, int]] = {},
+) -> dict:
+    r"""Summarizes one model for the metrics ledger
+
+    Parameters
+    ----------
+    runner : AlphaFold2 job runner
+    features_in : Input features, including MSA and templates
+    result : Output of runner.predict
+    random_seed : Random seed
+    outname : Name of PDB file written
+    timings : Name -> seconds spent in each stage
+    regions : Name -> (first, last) residue numbers for per-region pLDDT
+
+    Returns
+    ----------
+    Dictionary of scalar values
+
+    """
+
+    cfg = runner.config
+    plddt = np.asarray(result["plddt"])
+    resnum = np.asarray(features_in["residue_index"]) + 1
+
+    row = {
+        "outname": outname,
+        "timestamp": time.time(),
+        "random_seed": int(random_seed),
+        "use_templates": int(cfg.data.common.use_templates),
+        "max_msa_clusters": int(cfg.data.eval.max_msa_clusters),
+        "max_extra_msa": int(cfg.data.common.max_extra_msa),
+        "max_recycles": int(cfg.model.num_recycle),
+        "n_struct_module_repeats": int(cfg.model.heads.structure_module.num_layer),
+        "n_res": len(plddt),
+        "n_seqs": len(features_in["msa"]),
+        "plddt": float(plddt.mean()),
+        "ptm": float(result["ptm"]) if "ptm" in result else np.nan,
+        # Monomer models do not report it and always run every recycle
+        "recycles": int(result.get("num_recycles", cfg.model.num_recycle)),
+    }
+
+    for name, seconds in timings.items():
+        row[f"time_{ name }"] = float(seconds)
+
+    for name, (first, last) in regions.items():
+        mask = (resnum >= first) & (resnum <= last)
+        row[f"plddt_{ name }"] = float(plddt[mask].mean()) if mask.any() else np.nan
+
+    return row
+
+
 def run_one_job(
-    runner: model.RunModel, features_in: dict, random_seed: int, outname: str
+    runner: model.RunModel,
+    features_in: dict,
+    random_seed: int,
+    outname: str,
+    ledger: metrics.MetricsLedger = None,
+    metadata: Mapping[str, Any] = {},
+    regions: Mapping[str, Tuple[int, int]] = {},
+    cache_features: bool = True,
+    bfactor: bool = False,
 ) -> Mapping[str, Any]:
     r"""Runs one AF2 job with input parameters
 
@@ -130,6 +202,12 @@ def run_one_job(
     features_in : Input features, including MSA and templates
     random_seed : Random seed
     outname : Name of PDB file to write
+    ledger : Metrics ledger to append a row to (optional)
+    metadata : Extra values to store in the ledger row
+    regions : Name -> (first, last) residue numbers for per-region pLDDT
+    cache_features : Cache seed-independent processing (set to False to
+      reproduce the MSA sampling of runs made with runner.process_features)
+    bfactor : Write B factors converted from pLDDT instead of raw pLDDT
 
     Returns
     ----------
@@ -137,15 +215,36 @@ def run_one_job(
 
     """
 
-    # Do one last bit of processing
-    features = runner.process_features(features_in, random_seed=random_seed)
+    start = time.time()
+
+    # Do one last bit of processing (seed-independent steps are cached)
+    if cache_features:
+        features = processing.process_features(runner, features_in, random_seed)
+    else:
+        features = runner.process_features(features_in, random_seed=random_seed)
+    processed = time.time()
 
     # Generate the model
+    compiles = compilation_cache.stats()
     result = runner.predict(features, random_seed)
     pred = protein.from_prediction(features, result)
+    predicted = time.time()
+
+    # Persistent cache hits/misses and compile time reported by JAX
+    compiles = compilation_cache.since(compiles)
 
     # Write to file
-    to_pdb(outname, pred, result["plddt"], features_in["residue_index"])
+    to_pdb(outname, pred, result["plddt"], features_in["residue_index"], bfactor)
+
+    if ledger is not None:
+        timings = {"features": processed - start, "predict": predicted - processed}
+        row = metrics_row(
+            runner, features_in, result, random_seed, outname, timings, regions
+        )
+        row["compilation_cache_hits"] = compiles["hits"]
+        row["compilation_cache_misses"] = compiles["misses"]
+        row["time_compile"] = compiles["compile_secs"]
+        ledger.append({**row, **metadata})
 
     return result
 
@@ -162,6 +261,10 @@ def predict_structure_from_templates(
     max_extra_msa: int = -1,
     max_recycles: int = 3,
     n_struct_module_repeats: int = 8,
+    ledger: metrics.MetricsLedger = None,
+    cache_features: bool = True,
+    bfactor: bool = False,
+    regions: Mapping[str, Tuple[int, int]] = {},
 ) -> NoReturn:
 
     r"""Predicts the structure.
@@ -179,6 +282,11 @@ def predict_structure_from_templates(
     max_extra_msa : Number of extra seqs for summary stats
     max_recycles : Number of iterations through AF2
     n_struct_module_repeats : Number of passes through structural refinement
+    ledger : Metrics ledger to append a row to (optional)
+    cache_features : Cache seed-independent feature processing
+    bfactor : Write B factors converted from pLDDT instead of raw pLDDT
+    regions : Name -> (first, last) residue numbers for per-region pLDDT
+      in the ledger, e.g. { "tm1": ( 10, 35 ) }
     move_prefix : Prefix for temporary files (deleted after fxn completion)
 
     Returns
@@ -213,7 +321,17 @@ def predict_structure_from_templates(
         model_params=model_params,
     )
 
-    result = run_one_job(model_runner, features_in, random_seed, outname)
+    result = run_one_job(
+        model_runner,
+        features_in,
+        random_seed,
+        outname,
+        ledger=ledger,
+        metadata={"model_id": model_id, "model_params": model_params},
+        cache_features=cache_features,
+        bfactor=bfactor,
+        regions=regions,
+    )
 
     del model_runner
 
@@ -231,6 +349,10 @@ def predict_structure_no_templates(
     max_extra_msa: int = -1,
     max_recycles: int = 3,
     n_struct_module_repeats: int = 8,
+    ledger: metrics.MetricsLedger = None,
+    cache_features: bool = True,
+    bfactor: bool = False,
+    regions: Mapping[str, Tuple[int, int]] = {},
 ) -> NoReturn:
 
     r"""Predicts the structure.
@@ -246,6 +368,11 @@ def predict_structure_no_templates(
     max_extra_msa : Number of extra seqs for summary stats
     max_recycles : Number of iterations through AF2
     n_struct_module_repeats : Number of passes through structural refinement
+    ledger : Metrics ledger to append a row to (optional)
+    cache_features : Cache seed-independent feature processing
+    bfactor : Write B factors converted from pLDDT instead of raw pLDDT
+    regions : Name -> (first, last) residue numbers for per-region pLDDT
+      in the ledger, e.g. { "tm1": ( 10, 35 ) }
 
     Returns
     ----------
@@ -276,7 +403,17 @@ def predict_structure_no_templates(
         model_params=model_params,
     )
 
-    result = run_one_job(model_runner, features_in, random_seed, outname)
+    result = run_one_job(
+        model_runner,
+        features_in,
+        random_seed,
+        outname,
+        ledger=ledger,
+        metadata={"model_id": model_id, "model_params": model_params},
+        cache_features=cache_features,
+        bfactor=bfactor,
+        regions=regions,
+    )
 
     del model_runner
 
@@ -286,7 +423,7 @@ def predict_structure_from_custom_template(
     seq: str,
     outname: str,
     a3m_lines: str,
-    template_pdb: str,
+    template_pdb: Union[str, List[str]],
     model_id: int = -1,
     model_params: int = -1,
     random_seed: int = -1,
@@ -294,6 +431,10 @@ def predict_structure_from_custom_template(
     max_extra_msa: int = -1,
     max_recycles: int = 3,
     n_struct_module_repeats: int = 8,
+    ledger: metrics.MetricsLedger = None,
+    cache_features: bool = True,
+    bfactor: bool = False,
+    regions: Mapping[str, Tuple[int, int]] = {},
   ):
 
   f""" Predicts the structure.
@@ -303,6 +444,7 @@ def predict_structure_from_custom_template(
     outname : Name of output PDB
     a3m_lines : String of entire alignment
     template_pdb : name of the PDB file with path in case it's not in the local folder
+      (or a list of names to use several templates)
     model_id : Which AF2 model to run (must be 1 or 2 for templates)
     model_params : Which parameters to provide to AF2 model
     random_seed : Random seed
@@ -310,6 +452,11 @@ def predict_structure_from_custom_template(
     max_extra_msa : Number of extra seqs for summary stats
     max_recycles : Number of iterations through AF2
     n_struct_module_repeats : Number of passes through structural refinement
+    ledger : Metrics ledger to append a row to (optional)
+    cache_features : Cache seed-independent feature processing
+    bfactor : Write B factors converted from pLDDT instead of raw pLDDT
+    regions : Name -> (first, last) residue numbers for per-region pLDDT
+      in the ledger, e.g. { "tm1": ( 10, 35 ) }
 
 
   Output:
@@ -331,13 +478,8 @@ def predict_structure_from_custom_template(
   print( f"\tMaximum number of extra MSA clusters: { max_extra_msa }" )
   print( f"\tMaximum number of recycling iterations: { max_recycles }" )
 
-  pdb = protein.from_pdb_string( util.pdb2str( template_pdb ) )
-
-  tfeatures_in = {
-    "template_aatype" : jax.nn.one_hot( pdb.aatype, 22 )[ : ][ None ],
-    "template_all_atom_masks" : pdb.atom_mask[ : ][ None ],
-    "template_all_atom_positions" : pdb.atom_positions[ :][ None ],
-    "template_domain_names" : np.asarray( [ "None" ] ) }
+  # Parsed once per file and cached
+  tfeatures_in = template_library.default_library.featurize( template_pdb )
 
   # Assemble the dictionary of input features
   features_in = util.setup_features(
@@ -355,14 +497,34 @@ def predict_structure_from_custom_template(
       model_params=model_params,
   )
 
-  result = run_one_job(model_runner, features_in, random_seed, outname)
+  result = run_one_job(
+      model_runner,
+      features_in,
+      random_seed,
+      outname,
+      ledger=ledger,
+      metadata={
+          "model_id": model_id,
+          "model_params": model_params,
+          "template": ",".join(
+              [template_pdb] if isinstance(template_pdb, str) else template_pdb
+          ),
+      },
+      cache_features=cache_features,
+      bfactor=bfactor,
+      regions=regions,
+  )
 
   del model_runner
 
   return result
 
 def to_pdb(
-    outname, pred, plddts, res_idx  # type unknown but check?  # type unknown but check?
+    outname,
+    pred,
+    plddts,
+    res_idx,  # type unknown but check?  # type unknown but check?
+    bfactor: bool = False,
 ) -> NoReturn:
 
     r"""Writes unrelaxed PDB to file
@@ -373,6 +535,7 @@ def to_pdb(
     pred : Prediction to write to PDB
     plddts : Predicted errors
     res_idx : Residues to print (default=all)
+    bfactor : Convert pLDDTs to B factors (see util.plddt_to_bfactor_array)
 
     Returns
     ----------
@@ -380,10 +543,17 @@ def to_pdb(
 
     """
 
+    if bfactor:
+        plddts = np.minimum(util.plddt_to_bfactor_array(plddts), 999.99)
+
     with open(outname, "w") as outfile:
         outfile.write(protein.to_pdb(pred))
 
-    with open(f"b_{ outname }", "w") as outfile:
+    tmpname = os.path.join(
+        os.path.dirname(outname), f"b_{ os.path.basename(outname) }"
+    )
+
+    with open(tmpname, "w") as outfile:
         for line in open(outname, "r").readlines():
             if line[0:6] == "ATOM  ":
                 seq_id = int(line[22:26].strip()) - 1
@@ -394,4 +564,4 @@ def to_pdb(
                     )
                 )
 
-    os.rename(f"b_{ outname }", outname)
+    os.rename(tmpname, outname)
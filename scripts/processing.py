@@ -0,0 +1,216 @@
+import collections
+import hashlib
+import numpy as np
+
+import tensorflow.compat.v1 as tf
+import tree
+
+from alphafold.model import features
+from alphafold.model import model
+from alphafold.model.tf import data_transforms
+from alphafold.model.tf import input_pipeline
+from alphafold.model.tf import proteins_dataset
+
+from absl import logging
+from typing import List, Mapping
+
+# Deterministic features kept in memory, keyed by input features + data config
+_CACHE_SIZE = 8
+_cache = collections.OrderedDict()
+
+
+def _features_key(
+    features_in: dict, use_templates: bool, feature_names: List[str], num_res: int
+) -> str:
+
+    r"""Hashes input features and the settings nonensembled_map_fns uses
+    MSA depth and recycling settings only affect the ensembled stage, so
+    they are left out and a sweep over them reuses one cache entry
+
+    Parameters
+    ----------
+    features_in : Input features, including MSA and templates
+    use_templates : Whether template features are processed
+    feature_names : Features kept by make_data_config
+    num_res : Sequence length
+
+    Returns
+    ----------
+    Hex digest identifying this input/config pair
+
+    """
+
+    h = hashlib.sha1()
+    h.update(f"{ use_templates } { num_res } { sorted(feature_names) }".encode())
+
+    for key in sorted(features_in):
+        val = np.asarray(features_in[key])
+        h.update(key.encode())
+        if val.dtype == object:
+            h.update(repr(val.tolist()).encode())
+        else:
+            h.update(f"{ val.dtype }{ val.shape }".encode())
+            h.update(np.ascontiguousarray(val).tobytes())
+
+    return h.hexdigest()
+
+
+def process_nonensembled(
+    features_in: dict, runner: model.RunModel
+) -> Mapping[str, np.ndarray]:
+
+    r"""Runs the seed-independent part of AlphaFold's input pipeline
+    One-hot encodings, profiles, masks and template tensors are
+    computed here once per input/config and cached in memory
+
+    Parameters
+    ----------
+    features_in : Input features, including MSA and templates
+    runner : AlphaFold2 job runner
+
+    Returns
+    ----------
+    Dictionary of NumPy arrays prior to MSA sampling
+
+    """
+
+    num_res = int(features_in["seq_length"][0])
+    cfg, feature_names = features.make_data_config(runner.config, num_res=num_res)
+
+    key = _features_key(
+        features_in, cfg.common.use_templates, feature_names, num_res
+    )
+    if key in _cache:
+        logging.debug("Reusing processed features")
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    np_example = dict(features_in)
+
+    if "deletion_matrix_int" in np_example:
+        np_example["deletion_matrix"] = np_example.pop(
+            "deletion_matrix_int"
+        ).astype(np.float32)
+
+    tf_graph = tf.Graph()
+    with tf_graph.as_default(), tf.device("/device:CPU:0"):
+        tensors = proteins_dataset.np_to_tensor_dict(
+            np_example=np_example, features=feature_names
+        )
+        tensors = input_pipeline.compose(input_pipeline.nonensembled_map_fns(cfg))(
+            tensors
+        )
+        # The crop seed is drawn per seed in process_ensembled
+        tensors.pop("random_crop_to_size_seed", None)
+    tf_graph.finalize()
+
+    with tf.Session(graph=tf_graph) as sess:
+        processed = sess.run(tensors)
+
+    _cache[key] = processed
+    if len(_cache) > _CACHE_SIZE:
+        _cache.popitem(last=False)
+
+    return processed
+
+
+def process_ensembled(
+    processed: Mapping[str, np.ndarray],
+    runner: model.RunModel,
+    random_seed: int,
+) -> Mapping[str, np.ndarray]:
+
+    r"""Runs the stochastic part of AlphaFold's input pipeline
+    Mirrors the second half of input_pipeline.process_tensors_from_config
+    (MSA cluster sampling, masking, cropping and padding)
+
+    Parameters
+    ----------
+    processed : Output of process_nonensembled
+    runner : AlphaFold2 job runner
+    random_seed : Random seed
+
+    Returns
+    ----------
+    Features ready to pass to runner.predict
+
+    """
+
+    num_res = int(processed["seq_length"])
+    cfg, _ = features.make_data_config(runner.config, num_res=num_res)
+
+    no_templates = True
+    if "template_aatype" in processed:
+        no_templates = processed["template_aatype"].shape[0] == 0
+
+    tf_graph = tf.Graph()
+    with tf_graph.as_default(), tf.device("/device:CPU:0"):
+        tf.set_random_seed(random_seed)
+        tensors = {k: tf.constant(v) for k, v in processed.items()}
+        tensors = data_transforms.make_random_crop_to_size_seed(tensors)
+
+        def wrap_ensemble_fn(data, i):
+            d = data.copy()
+            d["ensemble_index"] = i
+            return input_pipeline.compose(input_pipeline.ensembled_map_fns(cfg))(d)
+
+        tensors_0 = wrap_ensemble_fn(tensors, tf.constant(0))
+        num_ensemble = cfg.eval.num_ensemble
+        if cfg.common.resample_msa_in_recycling:
+            num_ensemble *= cfg.common.num_recycle + 1
+
+        if num_ensemble > 1:
+            tensors = tf.map_fn(
+                lambda x: wrap_ensemble_fn(tensors, x),
+                tf.range(num_ensemble),
+                parallel_iterations=1,
+                fn_output_signature=tree.map_structure(
+                    tf.TensorSpec.from_tensor, tensors_0
+                ),
+            )
+        else:
+            tensors = tree.map_structure(lambda x: x[None], tensors_0)
+
+        # Template features are absent altogether when use_templates is False
+        if no_templates and "template_mask" in tensors:
+            tensors["template_mask"] = tf.zeros_like(tensors["template_mask"])
+    tf_graph.finalize()
+
+    with tf.Session(graph=tf_graph) as sess:
+        out = sess.run(tensors)
+
+    return {k: v for k, v in out.items() if v.dtype != "O"}
+
+
+def process_features(
+    runner: model.RunModel, features_in: dict, random_seed: int
+) -> Mapping[str, np.ndarray]:
+
+    r"""Drop-in replacement for runner.process_features
+    Deterministic processing is cached across seeds. The ensembled ops run
+    in their own TF graph, so a given random_seed samples different MSA
+    clusters than runner.process_features does; use the latter to
+    reproduce earlier seeded runs
+
+    Parameters
+    ----------
+    runner : AlphaFold2 job runner
+    features_in : Input features, including MSA and templates
+    random_seed : Random seed
+
+    Returns
+    ----------
+    Features ready to pass to runner.predict
+
+    """
+
+    return process_ensembled(
+        process_nonensembled(features_in, runner), runner, random_seed
+    )
+
+
+def clear_cache() -> None:
+
+    r"""Drops all cached deterministic features"""
+
+    _cache.clear()
@@ -0,0 +1,275 @@
+import numpy as np
+import os
+import pickle
+
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, NoReturn, Tuple
+
+# Byte alignment of each array within the shared block
+_ALIGN = 64
+
+
+def _split(features: Dict[str, Any]) -> Tuple[dict, dict]:
+
+    r"""Separates numeric arrays from everything else
+
+    Parameters
+    ----------
+    features : Input features, e.g. from util.setup_features
+
+    Returns
+    ----------
+    Tuple with [0] numeric arrays and [1] other values (strings, lists)
+
+    """
+
+    arrays, extras = {}, {}
+    for key, val in features.items():
+        arr = np.asarray(val)
+        if arr.dtype.kind in "biufc":
+            arrays[key] = np.ascontiguousarray(arr)
+        else:
+            extras[key] = val
+    return arrays, extras
+
+
+class FeatureBundle:
+
+    r"""Input features packed into one shared memory block
+
+    One producer builds features (e.g. with util.setup_features) and calls
+    FeatureBundle.create; worker processes receive the small, picklable
+    handle and call FeatureBundle.attach to get read-only views of the
+    same memory, without copying the MSA or template tensors
+
+    Example usage:
+      bundle = FeatureBundle.create( features_in )
+      pool.map( work, [ bundle.handle ] * n_models )
+      ...
+      bundle.unlink()
+
+    Private variables
+    ----------
+    self.features: Dictionary of read-only arrays and other values
+    self._shm: Shared memory block
+    self._manifest: (key, dtype, shape, offset) for every array
+    self._extras: Values that are not numeric arrays
+    self._owner: Whether this process created the block
+    """
+
+    def __init__(
+        self,
+        shm: shared_memory.SharedMemory,
+        manifest: List[tuple],
+        extras: dict,
+        owner: bool,
+    ):
+
+        r"""Initialize bundle (use create or attach instead)
+
+        Parameters
+        ----------
+        shm : Shared memory block
+        manifest : (key, dtype, shape, offset) for every array
+        extras : Values that are not numeric arrays
+        owner : Whether this process created the block
+
+        """
+
+        self._shm = shm
+        self._manifest = manifest
+        self._extras = extras
+        self._owner = owner
+
+        self.features = dict(extras)
+        for key, dtype, shape, offset in manifest:
+            # frombuffer holds an export of shm.buf, so the block cannot be
+            # unmapped (close raises BufferError) while a view is alive
+            arr = np.frombuffer(
+                shm.buf, dtype=dtype, count=int(np.prod(shape)), offset=offset
+            ).reshape(shape)
+            arr.flags.writeable = False
+            self.features[key] = arr
+
+    @classmethod
+    def create(cls, features: Dict[str, Any]) -> "FeatureBundle":
+
+        r"""Copies features into a new shared memory block
+
+        Parameters
+        ----------
+        features : Input features, e.g. from util.setup_features
+
+        Returns
+        ----------
+        Bundle owning the block
+
+        """
+
+        arrays, extras = _split(features)
+
+        manifest, size = [], 0
+        for key, arr in arrays.items():
+            size = -(-size // _ALIGN) * _ALIGN
+            manifest.append((key, arr.dtype.str, arr.shape, size))
+            size += arr.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for key, dtype, shape, offset in manifest:
+            dest = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            dest[...] = arrays[key]
+            del dest
+
+        return cls(shm, manifest, extras, owner=True)
+
+    @property
+    def handle(self) -> Tuple[str, List[tuple], dict]:
+
+        r"""Small picklable description to send to worker processes
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        Tuple with [0] block name, [1] manifest, and [2] other values
+
+        """
+
+        return self._shm.name, self._manifest, self._extras
+
+    @classmethod
+    def attach(cls, handle: Tuple[str, List[tuple], dict]) -> "FeatureBundle":
+
+        r"""Maps an existing block into this process
+
+        Parameters
+        ----------
+        handle : FeatureBundle.handle from the producer
+
+        Returns
+        ----------
+        Bundle with read-only views of the producer's arrays
+
+        """
+
+        name, manifest, extras = handle
+
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching also registers the block, and the
+            # resource tracker would unlink it when this worker exits
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args: None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+
+        return cls(shm, manifest, extras, owner=False)
+
+    def close(self) -> NoReturn:
+
+        r"""Detaches from the block
+        Raises BufferError while arrays from self.features are still
+        referenced elsewhere
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        None
+
+        """
+
+        self.features = {}
+        self._shm.close()
+
+    def unlink(self) -> NoReturn:
+
+        r"""Detaches and frees the block (producer only)
+        The block is freed even if detaching fails
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        ----------
+        None
+
+        """
+
+        try:
+            self.close()
+        finally:
+            if self._owner:
+                self._shm.unlink()
+
+    def __enter__(self) -> "FeatureBundle":
+        return self
+
+    def __exit__(self, *args) -> NoReturn:
+        if self._owner:
+            self.unlink()
+        else:
+            self.close()
+
+
+def save_memmap(features: Dict[str, Any], dirname: str) -> NoReturn:
+
+    r"""Writes features to a directory that can be memory-mapped
+    An alternative to FeatureBundle that also works across machines
+    sharing a filesystem, or across separate runs
+
+    Parameters
+    ----------
+    features : Input features, e.g. from util.setup_features
+    dirname : Output directory
+
+    Returns
+    ----------
+    None
+
+    """
+
+    arrays, extras = _split(features)
+
+    os.makedirs(dirname, exist_ok=True)
+    for key, arr in arrays.items():
+        np.save(os.path.join(dirname, f"{ key }.npy"), arr)
+
+    with open(os.path.join(dirname, "extras.pkl"), "wb") as outfile:
+        pickle.dump(extras, outfile)
+
+
+def load_memmap(dirname: str) -> Dict[str, Any]:
+
+    r"""Maps features written by save_memmap read-only
+    Processes loading the same directory share one page-cached copy
+
+    Parameters
+    ----------
+    dirname : Directory written by save_memmap
+
+    Returns
+    ----------
+    Dictionary of read-only memory-mapped arrays and other values
+
+    """
+
+    with open(os.path.join(dirname, "extras.pkl"), "rb") as infile:
+        features = pickle.load(infile)
+
+    for filename in os.listdir(dirname):
+        if filename.endswith(".npy"):
+            features[filename[:-4]] = np.load(
+                os.path.join(dirname, filename), mmap_mode="r"
+            )
+
+    return features
@@ -0,0 +1,136 @@
+from . import util
+
+import hashlib
+import numpy as np
+import os
+
+from alphafold.common import protein
+
+from absl import logging
+from typing import Dict, List, Union
+
+
+class TemplateLibrary:
+
+    r"""Cache of custom template features
+
+    Parses each custom PDB file once into NumPy feature arrays, keyed by
+    the SHA-1 hash of the file contents so that edited files are reparsed
+
+    Private variables
+    ----------
+    self.cache_dir: Directory for .npz copies of parsed templates (optional)
+    self._features: Parsed templates held in memory
+    """
+
+    def __init__(self, cache_dir: str = ""):
+
+        r"""Initialize template library
+
+        Parameters
+        ----------
+        cache_dir : Directory to store parsed templates (empty=memory only)
+
+        """
+
+        self.cache_dir = cache_dir
+        self._features = {}
+
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _hash(self, pdb_file: str) -> str:
+
+        r"""Hashes the contents of a PDB file
+
+        Parameters
+        ----------
+        pdb_file : Name of PDB file
+
+        Returns
+        ----------
+        Hex digest of file contents
+
+        """
+
+        h = hashlib.sha1()
+        with open(pdb_file, "rb") as infile:
+            for chunk in iter(lambda: infile.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def load(self, pdb_file: str) -> Dict[str, np.ndarray]:
+
+        r"""Featurizes a single custom template
+
+        Parameters
+        ----------
+        pdb_file : Name of PDB file
+
+        Returns
+        ----------
+        Dictionary of template features without the leading template axis
+
+        """
+
+        key = self._hash(pdb_file)
+
+        if key in self._features:
+            return self._features[key]
+
+        path = os.path.join(self.cache_dir, f"{ key }.npz")
+        if self.cache_dir and os.path.isfile(path):
+            with np.load(path) as cached:
+                features = dict(cached)
+
+        else:
+            logging.debug(f"Parsing template { pdb_file }")
+            pdb = protein.from_pdb_string(util.pdb2str(pdb_file))
+            features = {
+                "template_aatype": np.eye(22, dtype=np.float32)[pdb.aatype],
+                "template_all_atom_masks": pdb.atom_mask,
+                "template_all_atom_positions": pdb.atom_positions,
+            }
+            if self.cache_dir:
+                # Other processes may be reading the cache directory
+                tmp = f"{ path }.{ os.getpid() }.tmp"
+                with open(tmp, "wb") as outfile:
+                    np.savez(outfile, **features)
+                os.replace(tmp, path)
+
+        self._features[key] = features
+        return features
+
+    def featurize(self, pdb_files: Union[str, List[str]]) -> Dict[str, np.ndarray]:
+
+        r"""Stacks one or more custom templates into a feature set
+
+        Parameters
+        ----------
+        pdb_files : Name of PDB file, or list of names
+
+        Returns
+        ----------
+        Template features to pass to util.setup_features
+
+        """
+
+        if isinstance(pdb_files, str):
+            pdb_files = [pdb_files]
+
+        if len(pdb_files) == 0:
+            raise ValueError("At least one custom template is required")
+
+        loaded = [self.load(pdb_file) for pdb_file in pdb_files]
+
+        lengths = {len(t["template_aatype"]) for t in loaded}
+        if len(lengths) > 1:
+            raise ValueError("Custom templates must all have the same length")
+
+        features = {k: np.stack([t[k] for t in loaded]) for k in loaded[0]}
+        features["template_domain_names"] = np.asarray(["None"] * len(loaded))
+
+        return features
+
+
+default_library = TemplateLibrary()
@@ -1,5 +1,10 @@
+import concurrent.futures
+import dataclasses
+import functools
 import os
 import numpy as np
+import shutil
+import tempfile
 
 from typing import Dict, List, NoReturn
 
@@ -153,31 +158,148 @@ def mutate(x, y):
     mutate_msa(x, y)  # Alias for brevity
 
 
-def plddt_to_bfactor(filename: str, maxval: float = 100.0) -> NoReturn:
-    r"""Converts a pLDDT vals to a B factor
+def plddt_to_bfactor_array(plddt: np.ndarray, maxval: float = 100.0) -> np.ndarray:
+    r"""Converts an array of pLDDT vals to B factors
     This equation is derived from the following publication:
     "Improved protein structure refinement guided by deep learning based
     accuracy estimation" by Hiranuma et al 2021
     https://doi.org/10.1038/s41467-021-21511-x
 
+    Parameters
+    ----------
+    plddt : pLDDT values (any shape)
+    maxval : Set to 100 if using AF2 (or 1 if RoseTTAFold)
+
+    Returns
+    ----------
+    B factors (same shape)
+
+    """
+    rmsf = 1.5 * np.exp(4 * (0.7 - (np.asarray(plddt, dtype=np.float64) / maxval)))
+    return (8.0 / 3.0) * (np.pi**2) * (rmsf**2)
+
+
+def plddt_to_bfactor_protein(pred, plddt: np.ndarray, maxval: float = 100.0):
+    r"""Sets the B factors of an in-memory prediction from its pLDDT vals
+    Useful before writing with protein.to_pdb, since the Protein returned
+    by protein.from_prediction has zero B factors
+
+    Parameters
+    ----------
+    pred : alphafold.common.protein.Protein
+    plddt : Per-residue pLDDT values, e.g. result[ "plddt" ]
+    maxval : Set to 100 if using AF2 (or 1 if RoseTTAFold)
+
+    Returns
+    ----------
+    Copy of the prediction with converted B factors on every atom
+
+    """
+    bfactors = np.minimum(plddt_to_bfactor_array(plddt, maxval), 999.99)
+    return dataclasses.replace(
+        pred, b_factors=bfactors[:, None] * pred.atom_mask
+    )
+
+
+def _convert_bfactor_column(data: bytes, maxval: float) -> bytes:
+    r"""Rewrites the B factor column (columns 61-66) of a PDB file
+    Works on the raw bytes: records are located and their fixed-width
+    fields gathered and scattered with array indexing
+
+    Parameters
+    ----------
+    data : Contents of PDB file
+    maxval : Set to 100 if using AF2 (or 1 if RoseTTAFold)
+
+    Returns
+    ----------
+    Contents of PDB file with converted B factors
+
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    newlines = np.flatnonzero(buf == ord("\n"))
+    starts = np.concatenate([[0], newlines + 1])
+    ends = np.concatenate([newlines, [len(buf)]])
+
+    starts = starts[ends - starts >= 66]
+    record = buf[starts[:, None] + np.arange(6)].copy().view("S6").ravel()
+    starts = starts[(record == b"ATOM  ") | (record == b"HETATM")]
+    if len(starts) == 0:
+        return data
+
+    # Fixed columns: parse and format every B factor in one shot
+    field = starts[:, None] + np.arange(60, 66)
+    column = buf[field].copy().view("S6").ravel()
+    bfactors = plddt_to_bfactor_array(column.astype(np.float64), maxval)
+
+    # Values past 999.99 would overflow the six-character field
+    column = np.char.mod("%6.2f", np.minimum(bfactors, 999.99)).astype("S6")
+
+    out = buf.copy()
+    out[field] = column.view(np.uint8).reshape(-1, 6)
+    return out.tobytes()
+
+
+def plddt_to_bfactor(
+    filename: str, maxval: float = 100.0, outname: str = ""
+) -> NoReturn:
+    r"""Converts the pLDDT vals in a PDB file to B factors
+    The file is rewritten in place via an atomic rename unless an
+    output name is given
+
     Parameters
     ----------
     filename : Name of PDB file
     maxval : Set to 100 if using AF2 (or 1 if RoseTTAFold)
+    outname : Name of output PDB (default=overwrite input)
 
     Returns
     ----------
     None
 
     """
-    pdb = Bio.PDB.PDBParser().get_structure("TEMP", filename)
-    for atom in pdb.get_atoms():
-        rmsf = 1.5 * np.exp(4 * (0.7 - (atom.bfactor / maxval)))
-        atom.bfactor = (8.0 / 3.0) * (np.pi**2) * (rmsf**2)
-
-    pdbio = Bio.PDB.PDBIO()
-    pdbio.set_structure(pdb)
-    pdbio.save(filename)
+    with open(filename, "rb") as infile:
+        data = _convert_bfactor_column(infile.read(), maxval)
+
+    outname = outname or filename
+    fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(outname)))
+    try:
+        with os.fdopen(fd, "wb") as outfile:
+            outfile.write(data)
+        shutil.copymode(filename, tmpname)
+        os.replace(tmpname, outname)
+    except BaseException:
+        os.remove(tmpname)
+        raise
+
+
+def plddt_to_bfactor_bulk(
+    filenames: List[str], maxval: float = 100.0, n_workers: int = 1
+) -> NoReturn:
+    r"""Converts the pLDDT vals to B factors across many PDB files in place
+
+    Example usage: plddt_to_bfactor_bulk( glob.glob( "models/*.pdb" ), n_workers=8 )
+
+    Parameters
+    ----------
+    filenames : Names of PDB files
+    maxval : Set to 100 if using AF2 (or 1 if RoseTTAFold)
+    n_workers : Number of processes to use
+
+    Returns
+    ----------
+    None
+
+    """
+    if n_workers <= 1:
+        for filename in filenames:
+            plddt_to_bfactor(filename, maxval)
+        return
+
+    fn = functools.partial(plddt_to_bfactor, maxval=maxval)
+    with concurrent.futures.ProcessPoolExecutor(n_workers) as pool:
+        list(pool.map(fn, filenames, chunksize=64))
+
 
 def pdb2str( pdbfile: str ) -> str:
 